@@ -0,0 +1,164 @@
+'''
+Batch puzzle generation for classroom puzzle packs.
+
+Generates many puzzles at once across a pool of worker processes and writes
+them out as they are finished, either one JSON object per line or as a
+binary puzzle bank (see PuzzleBank) that the game can load. Every puzzle gets
+its own seed worked out from the master seed and its position in the batch,
+so a given master seed always gives the same pack, whatever the number of
+workers. With --dedup, puzzles that are the same as an earlier one up to
+renaming letters, swapping rows, columns, bands or stacks, or transposing
+(see Canonical) are dropped as they arrive, and more are generated to make
+up the count.
+
+Usage:
+    python BatchGenerate.py 1000 --size 9 --difficulty Hard --seed 42 -o pack.jsonl
+    python BatchGenerate.py 100000 --format bank -o banks/4x4-Easy.kspb
+    python BatchGenerate.py 500 --difficulty Hard --dedup -o distinct.jsonl
+'''
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from Canonical import DedupIndex
+from PuzzleBank import PuzzleBankWriter
+from PuzzleGenerator import DIFFICULTIES, generatePuzzle
+from SudokuBoard import BOX_SHAPES, symbolsFor
+
+MIN_ROUND = 256   # Fewest puzzles generateDistinct asks the workers for at a time
+PATIENCE = 5000   # Repeats in a row after which generateDistinct gives up
+
+def puzzleSeed(masterSeed, index):
+    'Returns the seed of the puzzle at the given position in a batch.'
+    return masterSeed * 2 ** 32 + index
+
+def cellsToText(cells, size):
+    'Returns the cells as one line of letters, with "." for empty cells.'
+    symbols = symbolsFor(size)
+    return ''.join(symbols[value - 1] if value else '.' for value in cells)
+
+def puzzleToJson(puzzle, index):
+    'Returns the puzzle at the given position in a batch as a line of JSON.'
+    size = puzzle.boxRows * puzzle.boxCols
+    return json.dumps({'index': index,
+                       'seed': puzzle.seed,
+                       'size': size,
+                       'difficulty': puzzle.difficulty,
+                       'puzzle': cellsToText(puzzle.cells, size),
+                       'solution': cellsToText(puzzle.solution, size)})
+
+def _generateOne(job):
+    'Worker: generates one puzzle.'
+    index, masterSeed, size, difficulty = job
+    return generatePuzzle(puzzleSeed(masterSeed, index), size, difficulty)
+
+def generateBatch(count, size=4, difficulty='Easy', masterSeed=0, workers=None, start=0):
+    '''
+    Generates puzzles in parallel and yields them in order as they complete.
+
+    Parameters:
+        count (int): How many puzzles to generate.
+        size (int): The board size (4, 9, 16, ...).
+        difficulty (str): 'Easy' or 'Hard'.
+        masterSeed (int): The seed for the whole batch.
+        workers (int): Number of worker processes (defaults to the CPU count).
+        start (int): Batch position of the first puzzle.
+
+    Yields:
+        Puzzle: The puzzles, in batch order.
+    '''
+    workers = workers or os.cpu_count() or 1
+    jobs = ((index, masterSeed, size, difficulty) for index in range(start, start + count))
+    if workers == 1:
+        for job in jobs:
+            yield _generateOne(job)
+        return
+    # Small chunks keep results streaming; large ones cut the messaging cost
+    chunksize = max(1, min(64, count // (workers * 8)))
+    with multiprocessing.Pool(workers) as pool:
+        for puzzle in pool.imap(_generateOne, jobs, chunksize):
+            yield puzzle
+
+def generateDistinct(count, size=4, difficulty='Easy', masterSeed=0, workers=None, patience=PATIENCE):
+    '''
+    Like generateBatch, but drops every puzzle that is equivalent to one
+    already yielded, generating more until count distinct puzzles are found.
+    The result is still fully determined by the master seed. Small boards
+    only have a few hundred distinct puzzles, so it stops early, with fewer
+    than count, once patience puzzles in a row were all repeats.
+    '''
+    seen = DedupIndex(*BOX_SHAPES[size])
+    found = 0
+    repeats = 0 # Repeats since the last new puzzle
+    start = 0
+    while found < count:
+        # Rounds never shrink below MIN_ROUND, so the workers stay busy near the end
+        wanted = max(count - found, MIN_ROUND)
+        for puzzle in generateBatch(wanted, size, difficulty, masterSeed, workers, start):
+            if seen.add(puzzle.cells):
+                found += 1
+                repeats = 0
+                yield puzzle
+                if found == count:
+                    return
+            else:
+                repeats += 1
+                if repeats >= patience:
+                    return
+        start += wanted
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a pack of Sudoku puzzles.')
+    parser.add_argument('count', type=int, help='number of puzzles to generate')
+    parser.add_argument('--size', type=int, default=4, choices=sorted(BOX_SHAPES),
+                        help='board size (default 4)')
+    parser.add_argument('--difficulty', default='Easy', choices=DIFFICULTIES,
+                        help='target difficulty (default Easy)')
+    parser.add_argument('--seed', type=int, default=0, help='master seed (default 0)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--format', default='jsonl', choices=('jsonl', 'bank'),
+                        help='JSON lines or a binary puzzle bank (default jsonl)')
+    parser.add_argument('--dedup', action='store_true',
+                        help='drop puzzles equivalent to an earlier one (4x4 and 6x6 only)')
+    parser.add_argument('-o', '--output', default='-', help='output file (default stdout)')
+    args = parser.parse_args(argv)
+    if args.format == 'bank' and args.output == '-':
+        parser.error('a puzzle bank needs an output file (-o)')
+    if args.dedup and args.size not in (4, 6):
+        parser.error('--dedup is only available for 4x4 and 6x6 boards')
+
+    if args.dedup:
+        puzzles = generateDistinct(args.count, args.size, args.difficulty, args.seed, args.workers)
+    else:
+        puzzles = generateBatch(args.count, args.size, args.difficulty, args.seed, args.workers)
+    start = time.perf_counter()
+    written = 0
+    if args.format == 'bank':
+        with PuzzleBankWriter(args.output, args.size) as bank:
+            for puzzle in puzzles:
+                bank.write(puzzle)
+                written += 1
+    else:
+        output = sys.stdout if args.output == '-' else open(args.output, 'w')
+        try:
+            for puzzle in puzzles:
+                output.write(puzzleToJson(puzzle, written) + '\n')
+                output.flush()
+                written += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    elapsed = time.perf_counter() - start
+    print('Generated %d puzzles in %.2f s (%.1f puzzles/s)'
+          % (written, elapsed, written / elapsed if elapsed else 0), file=sys.stderr)
+    if written < args.count:
+        print('Only %d distinct puzzles found, %d short of %d: the last %d made were all repeats'
+              % (written, args.count - written, args.count, PATIENCE), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
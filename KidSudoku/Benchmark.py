@@ -0,0 +1,250 @@
+'''
+Benchmarks for the game engine, with a stored baseline to catch slowdowns.
+
+Every run uses the same puzzles: the corpus for each board size and
+difficulty is made by generatePuzzle from fixed seeds, and making it is
+itself the generation benchmark. The other benchmarks then run over that
+corpus:
+
+    generate   generatePuzzle, one puzzle per sample
+    solve      the MRV solver on each puzzle (solveCells, used by board.solve)
+    check      Game.check for every letter in every empty cell (the rule checks)
+    hint       Game.hint for every empty cell
+    tip        Game.tip, the explained next step (LogicSolver)
+
+Each puzzle is one sample, timed on its own (the fastest of a few runs, to
+filter out noise from the rest of the machine), and the report gives the
+throughput and the 50th, 90th and 99th percentile time per operation. Each
+benchmark is then run once more under tracemalloc to measure its peak
+memory; that run is not timed, since tracing slows everything down.
+
+Results are written as JSON. Given a baseline file, the run fails (exit
+status 1) if any benchmark's median time or peak memory grew by more than
+the tolerance. Virtual machines speed up and slow down by tens of percent
+from one second to the next, so a fixed reference loop is timed around
+every benchmark and medians are compared as multiples of it. That cancels
+out most of the drift, though not a change of machine or Python version,
+so save the baseline where the comparison runs.
+
+Usage:
+    python Benchmark.py -o results.json
+    python Benchmark.py --baseline benchmarks/baseline.json
+    python Benchmark.py --save-baseline benchmarks/baseline.json
+'''
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from BatchGenerate import puzzleSeed
+from Metrics import percentile
+from PuzzleGenerator import generatePuzzle
+from SudokuGame import Game
+from SudokuSolver import solveCells
+
+# Puzzles per corpus: (size, difficulty) -> count
+CORPORA = {(4, 'Easy'): 200, (4, 'Hard'): 200,
+           (9, 'Easy'): 20, (9, 'Hard'): 20,
+           (16, 'Easy'): 3, (16, 'Hard'): 2}
+CORPUS_SEED = 20240103
+TOLERANCE = 0.5       # Allowed growth over the baseline; lower it on a quiet machine
+NOISE_FLOOR = 2e-6    # Median changes smaller than this (in seconds) are ignored
+
+def corpusSeeds(size, difficulty):
+    'Returns the fixed seeds of a corpus.'
+    return [puzzleSeed(CORPUS_SEED, number) for number in range(CORPORA[size, difficulty])]
+
+def easyGame(puzzle):
+    'Returns an Easy mode game of the puzzle, so hints and tips are allowed.'
+    return Game(puzzle, 'Easy')
+
+def checkAll(game):
+    checks = 0
+    for index, value in enumerate(game.puzzle.cells):
+        if not value:
+            for letter in range(1, game.size + 1):
+                game.check(index // game.size, index % game.size, letter)
+                checks += 1
+    return checks
+
+def hintAll(game):
+    hints = 0
+    for index, value in enumerate(game.puzzle.cells):
+        if not value:
+            game.hint(index // game.size, index % game.size)
+            hints += 1
+    return hints
+
+def tipOnce(game):
+    game.tip()
+    return 1
+
+def solveOnce(puzzle):
+    solveCells(puzzle.cells, puzzle.boxRows, puzzle.boxCols)
+    return 1
+
+# name -> (setup run untimed on each puzzle, timed function run on what the
+# setup returns and returning how many operations it did)
+WORKLOADS = {'solve': (None, solveOnce),
+             'check': (easyGame, checkAll),
+             'hint': (easyGame, hintAll),
+             'tip': (easyGame, tipOnce)}
+
+def calibrate():
+    'Returns the time of a fixed loop of plain Python arithmetic.'
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        total = 0
+        for number in range(20000):
+            total = (total * 31 + number) & 0xffff
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def summarize(samples, operations, seconds, peakBytes, reference):
+    '''
+    Summarizes one benchmark.
+
+    Parameters:
+        samples (list): Seconds per operation, one entry per sample.
+        operations (int): Operations in one pass over the corpus.
+        seconds (float): Time of one pass over the corpus.
+        peakBytes (int): Peak traced memory.
+        reference (float): Time of the calibrate() loop around the run.
+
+    Returns:
+        dict: The numbers that go in the results file.
+    '''
+    return {'operations': operations,
+            'seconds': seconds,
+            'perSecond': operations / seconds if seconds else 0.0,
+            'p50': percentile(samples, 0.5),
+            'p90': percentile(samples, 0.9),
+            'p99': percentile(samples, 0.99),
+            'max': max(samples),
+            'peakBytes': peakBytes,
+            'reference': reference}
+
+def peakMemory(function, *args):
+    'Runs a function under tracemalloc and returns its peak memory in bytes.'
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def runBenchmarks(only=None, repeat=5, output=sys.stderr):
+    '''
+    Runs the benchmarks.
+
+    Parameters:
+        only (list): Names of the benchmarks to run (default all).
+        repeat (int): How many times each workload runs; the fastest run
+                      of each puzzle counts.
+        output: Where progress is printed (None for nowhere).
+
+    Returns:
+        dict: Benchmark name ('generate/9-Hard', ...) -> summary.
+    '''
+    results = {}
+    for (size, difficulty) in CORPORA:
+        seeds = corpusSeeds(size, difficulty)
+        before = calibrate()
+        samples = [float('inf')] * len(seeds)
+        for _ in range(repeat if not only or 'generate' in only else 1):
+            corpus = []
+            for number, seed in enumerate(seeds):
+                start = time.perf_counter()
+                corpus.append(generatePuzzle(seed, size, difficulty))
+                samples[number] = min(samples[number], time.perf_counter() - start)
+        reference = (before + calibrate()) / 2
+        tag = '%d-%s' % (size, difficulty)
+        if not only or 'generate' in only:
+            peak = peakMemory(generatePuzzle, seeds[0], size, difficulty)
+            results['generate/' + tag] = summarize(samples, len(samples), sum(samples), peak, reference)
+        for name, (setup, workload) in WORKLOADS.items():
+            if only and name not in only:
+                continue
+            subjects = [setup(puzzle) if setup else puzzle for puzzle in corpus]
+            best = [float('inf')] * len(subjects)
+            counts = [0] * len(subjects)
+            before = calibrate()
+            for _ in range(repeat):
+                for number, subject in enumerate(subjects):
+                    start = time.perf_counter()
+                    counts[number] = workload(subject)
+                    best[number] = min(best[number], time.perf_counter() - start)
+            reference = (before + calibrate()) / 2
+            samples = [elapsed / count for elapsed, count in zip(best, counts)]
+            peak = peakMemory(lambda: [workload(setup(puzzle) if setup else puzzle) for puzzle in corpus])
+            results[name + '/' + tag] = summarize(samples, sum(counts), sum(best), peak, reference)
+        if output is not None:
+            print('Benchmarked %dx%d %s' % (size, size, difficulty), file=output)
+    return results
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    '''
+    Compares results with a baseline.
+
+    Returns:
+        list: One line per regression (empty if there are none).
+    '''
+    regressions = []
+    for name, old in sorted(baseline.items()):
+        new = results.get(name)
+        if new is None:
+            continue
+        scale = old['reference'] / new['reference'] # Drift in machine speed between the runs
+        if new['p50'] * scale > old['p50'] * (1 + tolerance) and new['p50'] * scale - old['p50'] > NOISE_FLOOR:
+            regressions.append('%s: median %.1f us -> %.1f us (%.1f us at baseline machine speed)'
+                               % (name, old['p50'] * 1e6, new['p50'] * 1e6, new['p50'] * scale * 1e6))
+        if new['peakBytes'] > old['peakBytes'] * (1 + tolerance):
+            regressions.append('%s: peak memory %d -> %d bytes' % (name, old['peakBytes'], new['peakBytes']))
+    return regressions
+
+def report(results, output=sys.stdout):
+    'Prints a table of the results.'
+    print('%-22s %10s %12s %10s %10s %10s %10s' % ('benchmark', 'ops', 'ops/s', 'p50 us', 'p90 us',
+                                                   'p99 us', 'peak KiB'), file=output)
+    for name, result in results.items():
+        print('%-22s %10d %12.1f %10.1f %10.1f %10.1f %10.1f'
+              % (name, result['operations'], result['perSecond'], result['p50'] * 1e6, result['p90'] * 1e6,
+                 result['p99'] * 1e6, result['peakBytes'] / 1024), file=output)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Sudoku engine.')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='fail if the results are worse than this results file')
+    parser.add_argument('--save-baseline', metavar='PATH', help='save the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='allowed growth over the baseline (default %.2f)' % TOLERANCE)
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each workload (default 5)')
+    parser.add_argument('--only', action='append', choices=['generate'] + sorted(WORKLOADS),
+                        help='run only this benchmark (may be repeated)')
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(args.only, args.repeat)
+    report(results)
+    document = {'python': platform.python_version(), 'machine': platform.machine(),
+                'corpusSeed': CORPUS_SEED, 'benchmarks': results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as file:
+                json.dump(document, file, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['benchmarks']
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print('REGRESSION ' + line, file=sys.stderr)
+        if regressions:
+            return 1
+        print('No regressions against %s' % args.baseline, file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+'''
+Turns a SudokuBoard into the text shown to the player.
+
+Rendering is a pure function of the board: the colour of each cell comes
+from the board's given, player and highlight bitsets, and nothing on the
+board is changed to draw it.
+
+TerminalRenderer puts boards on the screen. On a terminal it draws a board
+once at the top of the screen, keeps the lines below it for the dialogue
+(a scrolling region, so prompts and messages never push the board away),
+and from then on moves the cursor to just the cells that changed and
+rewrites those, all in one write. A move then sends a few dozen bytes
+instead of the whole board, which is what matters on slow links to
+classroom terminals. When the output is not a terminal (a pipe, a file, a
+dumb terminal) or the board does not fit, it prints the whole board in
+plain text instead.
+'''
+
+import os
+import shutil
+import sys
+
+# Colours-------------------------------
+Red = "\033[0;31m"
+Normal = "\033[0m"
+Bold_Yellow = "\033[1;33m"
+Background_Red = "\033[41m"
+#---------------------------------------
+
+# Terminal control (VT100)
+CLEAR_SCREEN = "\033[H\033[2J"
+SAVE_CURSOR = "\0337"
+RESTORE_CURSOR = "\0338"
+RESET_SCROLLING = "\033[r"
+
+DIALOGUE_LINES = 6 # Lines the screen needs below the board for prompts and messages
+
+def renderCell(board, index, highlightMask, colours=True):
+    '''
+    Returns the text of one cell: its letter (or '0' when empty), in red if
+    the player filled it in and in yellow on red if it is highlighted.
+    '''
+    value = board.cells[index]
+    if not value:
+        return '0'
+    letter = board.symbols[value - 1]
+    if not colours:
+        return letter
+    if highlightMask >> index & 1:
+        return Bold_Yellow + Background_Red + letter + Normal
+    if board.userMask >> index & 1:
+        return Red + letter + Normal
+    return letter
+
+def renderBoard(board, highlightValue=None, colours=True):
+    '''
+    Returns the board as text, with a title and rows and columns labeled.
+
+    Parameters:
+        board (SudokuBoard): The board to draw.
+        highlightValue (int): Value to highlight; defaults to the board's own
+                              highlight setting (0 for none).
+        colours (bool): False to leave out the colour codes.
+
+    Returns:
+        str: The text to print.
+    '''
+    size = board.size
+    if highlightValue is None:
+        highlightMask = board.highlightMask
+    else:
+        highlightMask = board.valueCells[highlightValue] if highlightValue else 0
+    width = len(str(size))
+    pad = ' ' * (width - 1)
+    border = '   +' + ('-' * width + '+') * size
+    lines = ['', '=================', ' Sudoku For Kids', '=================',
+             '    ' + ' '.join(str(col + 1).rjust(width) for col in range(size)), border]
+    for row in range(size):
+        boxes = []
+        for boxStart in range(0, size, board.boxCols):
+            boxes.append(' '.join(pad + renderCell(board, row * size + col, highlightMask, colours)
+                                  for col in range(boxStart, boxStart + board.boxCols)))
+        lines.append('   |' + '|'.join(boxes) + '|')
+        if row % board.boxRows == board.boxRows - 1:
+            lines.append(border)
+    return '\n'.join(lines)
+
+def cellPosition(board, index):
+    '''
+    Returns where a cell is drawn in the text of renderBoard.
+
+    Returns:
+        tuple: (line, column), both counting from 1.
+    '''
+    row, col = divmod(index, board.size)
+    width = len(str(board.size))
+    # Six lines of title and column numbers come first, then a border
+    # line after every band of boxRows rows; each cell takes width + 1
+    # characters after the 4 of '   |'
+    return 7 + row + row // board.boxRows, 4 + col * (width + 1) + width
+
+class TerminalRenderer:
+    '''
+    Shows boards on a terminal, redrawing only the cells that changed.
+
+    Parameters:
+        output: Where to write (default sys.stdout).
+        colours (bool): Colour the letters; defaults to True on a terminal.
+        differential (bool): Redraw only changed cells; defaults to True on
+                             a terminal that understands cursor movement.
+    '''
+
+    def __init__(self, output=None, colours=None, differential=None):
+        self.output = output or sys.stdout
+        terminal = self.output.isatty()
+        self.colours = terminal if colours is None else colours
+        if differential is None:
+            differential = terminal and os.environ.get('TERM', 'dumb') != 'dumb'
+        self.differential = differential
+        self.board = None # The board on the screen (differential mode only)
+        self.shown = []   # The text of each of its cells as drawn
+
+    def write(self, text):
+        self.output.write(text)
+        self.output.flush()
+
+    def show(self, board):
+        '''
+        Shows the board: the whole of it if it is not the board already on
+        the screen (or in plain mode), otherwise just its changed cells.
+        '''
+        if not self.differential:
+            self.write(renderBoard(board, colours=self.colours) + '\n')
+            return
+        highlightMask = board.highlightMask
+        cells = [renderCell(board, index, highlightMask, self.colours) for index in range(len(board.cells))]
+        if board is not self.board:
+            self.drawAll(board, cells)
+            return
+        changes = []
+        for index, text in enumerate(cells):
+            if text != self.shown[index]:
+                changes.append('\033[%d;%dH%s' % (cellPosition(board, index) + (text,)))
+        if changes:
+            self.write(SAVE_CURSOR + ''.join(changes) + RESTORE_CURSOR)
+        self.shown = cells
+
+    def drawAll(self, board, cells):
+        'Clears the screen and draws the board at the top, above the dialogue.'
+        text = renderBoard(board, colours=self.colours)
+        lines = text.count('\n') + 1
+        height = shutil.get_terminal_size().lines
+        if height < lines + DIALOGUE_LINES:
+            # No room to keep the board in view: print it like plain mode
+            self.close()
+            self.write(text + '\n')
+            return
+        self.write(CLEAR_SCREEN + text + '\033[%d;%dr' % (lines + 1, height) + '\033[%d;1H' % (lines + 1))
+        self.board = board
+        self.shown = cells
+
+    def close(self):
+        'Gives the whole screen back to scrolling text.'
+        if self.board is not None:
+            self.write(RESET_SCROLLING + '\033[%d;1H' % shutil.get_terminal_size().lines)
+            self.board = None
@@ -0,0 +1,166 @@
+'''
+Canonical forms of Sudoku boards, for spotting puzzles that are really the
+same puzzle in disguise.
+
+Two boards are equivalent when one can be turned into the other by:
+
+- renaming the letters (e.g. swapping every A with every C),
+- swapping rows inside a band, or swapping whole bands,
+- swapping columns inside a stack, or swapping whole stacks,
+- transposing the board (only when the boxes are square).
+
+canonicalKey tries every row and column rearrangement, renames the letters
+in order of first appearance, and keeps the smallest result, so equivalent
+boards always get the same key. On a 4x4 board there are only 128
+rearrangements; 6x6 has 3456. 9x9 has over three million, which is too
+many to try for every puzzle, so keys are only made for boards up to
+MAX_SIZE and bigger ones raise ValueError.
+'''
+
+import itertools
+
+from DancingLinks import findSolutions
+
+MAX_SIZE = 6 # Largest board size with canonical keys
+
+_transforms = {}
+
+def _lineOrders(groups, groupSize):
+    'Returns every order of lines that only swaps groups and lines within a group.'
+    orders = []
+    for groupOrder in itertools.permutations(range(groups)):
+        inside = [list(itertools.permutations(range(group * groupSize, (group + 1) * groupSize)))
+                  for group in groupOrder]
+        for choice in itertools.product(*inside):
+            orders.append([line for lines in choice for line in lines])
+    return orders
+
+def checkSize(boxRows, boxCols):
+    'Raises ValueError for boards too large for canonical keys.'
+    if boxRows * boxCols > MAX_SIZE:
+        raise ValueError('Canonical keys are only made for boards up to %dx%d, not %dx%d'
+                         % (MAX_SIZE, MAX_SIZE, boxRows * boxCols, boxRows * boxCols))
+
+def getTransforms(boxRows, boxCols):
+    '''
+    Returns every rearrangement of a board shape as a list of cell indexes:
+    cell i of the rearranged board is cell transform[i] of the original.
+    Boards larger than MAX_SIZE raise ValueError.
+    '''
+    checkSize(boxRows, boxCols)
+    key = (boxRows, boxCols)
+    if key not in _transforms:
+        size = boxRows * boxCols
+        rowOrders = _lineOrders(boxCols, boxRows) # boxCols bands of boxRows rows
+        colOrders = _lineOrders(boxRows, boxCols) # boxRows stacks of boxCols columns
+        transforms = []
+        for rowOrder in rowOrders:
+            for colOrder in colOrders:
+                transforms.append([row * size + col for row in rowOrder for col in colOrder])
+                if boxRows == boxCols:
+                    transforms.append([row + col * size for row in rowOrder for col in colOrder])
+        _transforms[key] = transforms
+    return _transforms[key]
+
+def canonicalKey(cells, boxRows, boxCols):
+    '''
+    Returns the canonical key of a board (complete or not).
+
+    Parameters:
+        cells (list): The cell values, row by row (0 for empty).
+        boxRows (int): Number of rows in a box.
+        boxCols (int): Number of columns in a box.
+
+    Returns:
+        bytes: The key; equivalent boards have equal keys.
+    '''
+    best = None
+    for transform in getTransforms(boxRows, boxCols):
+        names = {0: 0}
+        key = bytearray()
+        for index in transform:
+            value = cells[index]
+            if value not in names:
+                names[value] = len(names)
+            key.append(names[value])
+            if best is not None and key > best[:len(key)]:
+                break # Already bigger than the best key, no need to finish
+        else:
+            if best is None or key < best:
+                best = key
+    return bytes(best)
+
+def keyToCells(key):
+    'Returns the board that a canonical key stands for.'
+    return list(key)
+
+class DedupIndex:
+    '''
+    Remembers the canonical keys of the boards seen so far, so duplicates can
+    be dropped while puzzles are still being generated.
+    '''
+
+    def __init__(self, boxRows=2, boxCols=2):
+        checkSize(boxRows, boxCols)
+        self.boxRows = boxRows
+        self.boxCols = boxCols
+        self.keys = set()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, cells):
+        return canonicalKey(cells, self.boxRows, self.boxCols) in self.keys
+
+    def add(self, cells):
+        '''
+        Records a board.
+
+        Returns:
+            bool: True if the board is new, False if an equivalent board was
+                  already recorded.
+        '''
+        key = canonicalKey(cells, self.boxRows, self.boxCols)
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+def enumerateDistinctGrids(boxRows=2, boxCols=2):
+    '''
+    Returns one complete board for each class of equivalent complete boards.
+    Only practical for 4x4 boards, where 288 boards fall into 2 classes.
+    '''
+    size = boxRows * boxCols
+    index = DedupIndex(boxRows, boxCols)
+    for grid in findSolutions([0] * (size * size), boxRows, boxCols):
+        index.add(grid)
+    return [keyToCells(key) for key in sorted(index.keys)]
+
+def enumerateDistinctPuzzles(boxRows=2, boxCols=2):
+    '''
+    Yields every essentially different puzzle with exactly one solution, from
+    the complete boards down to the puzzles with the fewest clues.
+
+    Adding clues to a puzzle with one solution keeps it at one solution, so
+    every such puzzle can be reached from its solution by taking clues away
+    one at a time. This walks those steps level by level and keeps one
+    puzzle per class at each level. Only practical for 4x4 boards.
+
+    Yields:
+        list: Canonical cell values of each puzzle (0 for empty).
+    '''
+    level = set(canonicalKey(grid, boxRows, boxCols) for grid in enumerateDistinctGrids(boxRows, boxCols))
+    while level:
+        nextLevel = set()
+        for key in sorted(level):
+            cells = keyToCells(key)
+            yield list(cells)
+            for index, value in enumerate(cells):
+                if not value:
+                    continue
+                cells[index] = 0
+                if len(findSolutions(cells, boxRows, boxCols, 2)) == 1:
+                    nextLevel.add(canonicalKey(cells, boxRows, boxCols))
+                cells[index] = value
+        level = nextLevel
@@ -0,0 +1,248 @@
+'''
+Exact-cover solver for Sudoku boards using Knuth's Dancing Links (Algorithm X).
+
+Every way of putting a letter in a cell is a row of the exact-cover matrix,
+and every rule ("cell r,c is filled", "row r has letter v", "column c has
+letter v", "box b has letter v") is a column. A solved board picks exactly
+one row covering each column. Only the choices that are still possible
+after the givens are placed go into the matrix, which keeps it small.
+
+Unlike SudokuSolver, this solver keeps going after the first solution, so it
+can tell whether a puzzle has exactly one answer. Run this file to compare
+it with the MRV solver.
+'''
+
+import random
+import sys
+import time
+
+import FourByFour
+from SudokuSolver import getGeometry, solveCells
+
+def findSolutions(cells, boxRows, boxCols, limit=None):
+    '''
+    Finds the solutions of a board, stopping once limit of them are found.
+
+    Parameters:
+        cells (list): The cell values, row by row (0 for empty, 1 to N).
+        boxRows (int): Number of rows in a box.
+        boxCols (int): Number of columns in a box.
+        limit (int): The most solutions to look for (None for all of them).
+
+    Returns:
+        list: The solutions found, each a list of cell values.
+    '''
+    if (boxRows, boxCols) == (2, 2):
+        return FourByFour.completions(cells, limit) # Looked up, no search needed
+    size = boxRows * boxCols
+    area = size * size
+    rowOf, colOf, boxOf, units = getGeometry(boxRows, boxCols)
+
+    rows = [0] * size
+    cols = [0] * size
+    boxes = [0] * size
+    for index, value in enumerate(cells):
+        if value:
+            bit = 1 << (value - 1)
+            if (rows[rowOf[index]] | cols[colOf[index]] | boxes[boxOf[index]]) & bit:
+                return []
+            rows[rowOf[index]] |= bit
+            cols[colOf[index]] |= bit
+            boxes[boxOf[index]] |= bit
+
+    # Number the constraints that the givens have not satisfied yet
+    columnOf = {}
+    for index in range(area):
+        if not cells[index]:
+            columnOf[index] = len(columnOf) + 1
+    for unitMasks, offset in ((rows, area), (cols, 2 * area), (boxes, 3 * area)):
+        for unit in range(size):
+            for value in range(size):
+                if not unitMasks[unit] & (1 << value):
+                    columnOf[offset + unit * size + value] = len(columnOf) + 1
+
+    headers = len(columnOf)
+    L = list(range(-1, headers))
+    R = list(range(1, headers + 2))
+    L[0] = headers
+    R[headers] = 0
+    U = list(range(headers + 1))
+    D = list(range(headers + 1))
+    C = list(range(headers + 1))
+    S = [0] * (headers + 1)
+    choiceOf = [None] * (headers + 1)
+
+    allValues = (1 << size) - 1
+    for index in range(area):
+        if cells[index]:
+            continue
+        options = allValues & ~(rows[rowOf[index]] | cols[colOf[index]] | boxes[boxOf[index]])
+        while options:
+            bit = options & -options
+            options ^= bit
+            value = bit.bit_length() - 1
+            first = len(L)
+            for constraint in (index,
+                               area + rowOf[index] * size + value,
+                               2 * area + colOf[index] * size + value,
+                               3 * area + boxOf[index] * size + value):
+                column = columnOf[constraint]
+                node = len(L)
+                L.append(node - 1)
+                R.append(node + 1)
+                U.append(U[column])
+                D.append(column)
+                C.append(column)
+                choiceOf.append((index, value + 1))
+                D[U[column]] = node
+                U[column] = node
+                S[column] += 1
+            L[first] = len(L) - 1
+            R[len(R) - 1] = first
+
+    def cover(column):
+        R[L[column]] = R[column]
+        L[R[column]] = L[column]
+        i = D[column]
+        while i != column:
+            j = R[i]
+            while j != i:
+                U[D[j]] = U[j]
+                D[U[j]] = D[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def uncover(column):
+        i = U[column]
+        while i != column:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                U[D[j]] = j
+                D[U[j]] = j
+                j = L[j]
+            i = U[i]
+        R[L[column]] = column
+        L[R[column]] = column
+
+    def choose(node):
+        # Puts the row of node in the solution, covering its other columns
+        j = R[node]
+        while j != node:
+            cover(C[j])
+            j = R[j]
+
+    def unchoose(node):
+        j = L[node]
+        while j != node:
+            uncover(C[j])
+            j = L[j]
+
+    # Depth-first search with an explicit stack instead of recursion: one
+    # [column, row being tried] frame per level, so boards of any size stay
+    # within Python's recursion limit
+    solutions = []
+    stack = []
+    while True:
+        if R[0] == 0:
+            solution = list(cells)
+            for column, node in stack:
+                index, value = choiceOf[node]
+                solution[index] = value
+            solutions.append(solution)
+            if limit is not None and len(solutions) >= limit:
+                break
+        else:
+            # Branch on the constraint with the fewest ways left to satisfy it
+            column = R[0]
+            best = column
+            while column != 0:
+                if S[column] < S[best]:
+                    best = column
+                    if S[best] <= 1:
+                        break
+                column = R[column]
+            if S[best]:
+                cover(best)
+                stack.append([best, D[best]])
+                choose(D[best])
+                continue
+        # Take back choices until a column has another row to try
+        while stack:
+            frame = stack[-1]
+            best, node = frame
+            unchoose(node)
+            node = D[node]
+            if node != best:
+                frame[1] = node
+                choose(node)
+                break
+            uncover(best)
+            stack.pop()
+        else:
+            break
+    return solutions
+
+def countSolutions(board, limit=2):
+    '''
+    Counts the solutions of a board, stopping at limit. With the default
+    limit of 2 this answers "does this puzzle have exactly one solution?".
+
+    Parameters:
+        board (SudokuBoard): The board to check.
+        limit (int): The count to stop at (None to count every solution).
+
+    Returns:
+        int: The number of solutions found (never more than limit).
+    '''
+    return len(findSolutions(board.cells, board.boxRows, board.boxCols, limit))
+
+def hasUniqueSolution(board):
+    'Returns True if the board has exactly one solution.'
+    return countSolutions(board, 2) == 1
+
+def _benchmark(size, puzzles, clues, seed):
+    '''
+    Times the MRV backtracking solver against Dancing Links on random puzzles
+    with the given number of clues, and prints the results.
+    '''
+    from SudokuBoard import BOX_SHAPES
+
+    boxRows, boxCols = BOX_SHAPES[size]
+    rng = random.Random(seed)
+    corpus = []
+    for puzzle in range(puzzles):
+        cells = rng.sample(range(1, size + 1), size) + [0] * (size * size - size)
+        solution = solveCells(cells, boxRows, boxCols)
+        for index in rng.sample(range(size * size), size * size - clues):
+            solution[index] = 0
+        corpus.append(solution)
+
+    start = time.perf_counter()
+    for cells in corpus:
+        solveCells(cells, boxRows, boxCols)
+    backtracking = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for cells in corpus:
+        findSolutions(cells, boxRows, boxCols, 1)
+    firstSolution = time.perf_counter() - start
+
+    start = time.perf_counter()
+    unique = 0
+    for cells in corpus:
+        unique += len(findSolutions(cells, boxRows, boxCols, 2)) == 1
+    counting = time.perf_counter() - start
+
+    print('%2dx%-2d %3d clues  MRV solve %7.2f ms  DLX solve %7.2f ms  DLX count<=2 %7.2f ms  (%d/%d unique)'
+          % (size, size, clues, 1000 * backtracking / puzzles, 1000 * firstSolution / puzzles,
+             1000 * counting / puzzles, unique, puzzles))
+
+if __name__ == '__main__':
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 2024
+    print('Average time per puzzle (seed %d)' % seed)
+    _benchmark(4, 200, 6, seed)
+    _benchmark(9, 50, 30, seed)
+    _benchmark(9, 50, 24, seed)
+    _benchmark(16, 10, 150, seed)
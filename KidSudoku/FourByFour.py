@@ -0,0 +1,120 @@
+'''
+Every complete 4x4 board, and instant answers about 4x4 puzzles.
+
+A 4x4 Sudoku has only 288 complete boards, so instead of searching, the
+questions "can this board be finished?", "in exactly one way?" and "what
+are the ways?" are answered by looking the board up in a table of all of
+them. The table keeps, for every cell and letter, a 288-bit set of the
+complete boards with that letter in that cell. The boards that match a
+partly filled board are the AND of the sets of its letters: at most 16 ANDs
+of 288-bit numbers, however many letters are missing.
+
+SudokuSolver and DancingLinks hand every 4x4 board to this module, so the
+game, the generator and Canonical all use the table on 4x4 boards. The
+table is built when the module is first imported (a few milliseconds), so
+threads never see it half built.
+'''
+
+import itertools
+
+GRID_COUNT = 288
+SIZE = 4
+AREA = SIZE * SIZE
+
+def _build():
+    '''
+    Lists the 288 boards, row by row, and makes the lookup table.
+
+    Returns:
+        tuple: (boards, table): table[index][value] is the set of boards
+               with value in cell index.
+    '''
+    found = []
+    rows = list(itertools.permutations(range(1, SIZE + 1)))
+    for first in rows:
+        for second in rows:
+            # The top two rows share the boxes
+            if set(first[:2]) & set(second[:2]) or any(a == b for a, b in zip(first, second)):
+                continue
+            for third in rows:
+                if any(third[col] in (first[col], second[col]) for col in range(SIZE)):
+                    continue
+                fourth = tuple(10 - first[col] - second[col] - third[col] for col in range(SIZE))
+                if len(set(fourth)) < SIZE or set(third[:2]) & set(fourth[:2]):
+                    continue
+                found.append(first + second + third + fourth)
+    assert len(found) == GRID_COUNT
+    table = []
+    for index in range(AREA):
+        sets = [0] * (SIZE + 1)
+        for number, grid in enumerate(found):
+            sets[grid[index]] |= 1 << number
+        table.append(sets)
+    return found, table
+
+_grids, _table = _build()
+
+def grids():
+    'Returns every complete 4x4 board as a tuple of cell values.'
+    return _grids
+
+def matching(cells):
+    '''
+    Returns the set of complete boards that agree with a partly filled board.
+
+    Parameters:
+        cells (list): The 16 cell values, row by row (0 for empty).
+
+    Returns:
+        int: Bit k is set if board k of grids() matches.
+    '''
+    found = (1 << GRID_COUNT) - 1
+    for index, value in enumerate(cells):
+        if value:
+            found &= _table[index][value]
+    return found
+
+def isSolvable(cells):
+    'Returns True if the board can be finished.'
+    return matching(cells) != 0
+
+def countCompletions(cells):
+    'Returns the number of ways to finish the board.'
+    return bin(matching(cells)).count('1')
+
+def isUnique(cells):
+    'Returns True if the board can be finished in exactly one way.'
+    found = matching(cells)
+    return found != 0 and not found & (found - 1)
+
+def completions(cells, limit=None):
+    '''
+    Returns the ways to finish the board.
+
+    Parameters:
+        cells (list): The 16 cell values, row by row (0 for empty).
+        limit (int): The most completions to return (None for all).
+
+    Returns:
+        list: The completed boards, each a list of cell values.
+    '''
+    found = matching(cells)
+    result = []
+    while found and (limit is None or len(result) < limit):
+        low = found & -found
+        result.append(list(_grids[low.bit_length() - 1]))
+        found ^= low
+    return result
+
+def solve(cells, rng=None):
+    '''
+    Returns one way to finish the board, or None if there is none. With an
+    rng, the completion is picked at random.
+    '''
+    found = matching(cells)
+    if not found:
+        return None
+    if rng is not None:
+        numbers = [number for number in range(GRID_COUNT) if found >> number & 1]
+        return list(_grids[numbers[rng.randrange(len(numbers))]])
+    return list(_grids[(found & -found).bit_length() - 1])
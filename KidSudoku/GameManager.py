@@ -9,6 +9,13 @@ The game provides two difficulty levels, Easy and Hard, where players can solve
 with letters (A, B, C, D) instead of numbers. The game is designed to be educational and fun, 
 helping kids learn and practice Sudoku rules in a simplified format.
 
+The rules and game state live in SudokuGame (the headless engine); this file is
+the console front end, so importing it starts nothing. Run it to play.
+
+With KIDSUDOKU_SAVE set to a file name, the game in progress is saved there
+after every move (see SessionStore), so a player whose window closed or whose
+computer crashed is offered their game back the next time.
+
 Features:
 - Easy Mode: Allows hints and provides a less challenging puzzle.
 - Hard Mode: Does not allow hints and presents a more challenging puzzle.
@@ -22,26 +29,49 @@ BUGS (RARE):
 '''
 
 # Imports-------------------------------
+import atexit
+import getpass
+import os
 import random
-import sys
 import time
+
+from BoardRenderer import TerminalRenderer
+from Metrics import install as installMetrics, metrics
+from PuzzleBank import PuzzleBank, bankPath
+from PuzzleGenerator import generatePuzzle
+from PuzzlePool import PuzzlePool
+from SessionStore import SessionStore
+from SudokuGame import HORIZONTAL, SQUARE, VERTICAL, Game, MoveError
 #---------------------------------------
 
 # Colours-------------------------------
 Red = "\033[0;31m"
 Normal = "\033[0m"
-Bold_Yellow = "\033[1;33m"
 Background_Purple = "\033[45m"
-
-Background_Red = "\033[41m"
 #---------------------------------------
 
 # Constants-----------------------------
-BOARD_SIZE = 4
 BOARD_START_INDEX = 0
-BOARD_END_INDEX = 3
+
+# Pre-generated puzzle banks (made with BatchGenerate.py --format bank) are
+# looked up here, e.g. banks/4x4-Easy.kspb
+BANK_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'banks')
+
+RULE_NAMES = {HORIZONTAL: 'Horizontal', VERTICAL: 'Vertical', SQUARE: 'Square'}
 #---------------------------------------
 
+# Saved games (None unless KIDSUDOKU_SAVE is set), kept under the login name
+store = None
+DEFAULT_PLAYER = 'player' # Used when the login name cannot be found
+PLAYER = DEFAULT_PLAYER
+
+def loginName():
+    'Returns the login name to keep saved games under, or DEFAULT_PLAYER.'
+    try:
+        return getpass.getuser()
+    except (KeyError, OSError): # No USER or LOGNAME and no password entry, as in some containers
+        return DEFAULT_PLAYER
+
 def gameHeader():
     'Prints the header for the Sudoku game, introducing the game to the player.'
     print('''
@@ -52,40 +82,86 @@ def gameHeader():
 =+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=
 ''')
 
-def selectDifficulty():
-    difficulty = input("Select your Sudoku challenge level (Easy OR Hard): ")
-    difficulty = difficulty.replace(" ","")
-    if len(difficulty) == 4 and (('E' in difficulty[0] or 'e' in difficulty[0])
-                                 and ('A' in difficulty[1] or 'a' in difficulty[1])
-                                 and ('S' in difficulty[2] or 's' in difficulty[2])
-                                 and ('Y' in difficulty[3] or 'y' in difficulty[3])):
+def selectBoardSize():
+    '''
+    Asks the player how big the board should be. Pressing Enter keeps the
+    classic 4x4 board; older kids can pick 9x9 or 16x16.
+    
+    Returns:
+        int: The board size.
+    '''
+    while True:
+        size = input("Pick your board size (4, 9 or 16, press Enter for 4): ")
+        size = size.replace(" ","")
+        if size == '':
+            return 4
+        elif size.isdigit() and int(size) in (4, 9, 16):
+            return int(size)
+        else:
+            print(Red + "Enter a valid board size (4, 9 or 16)!" + Normal)
+
+def readDifficulty():
+    '''
+    Asks the player for a difficulty until they type Easy or Hard.
+
+    Returns:
+        str: 'Easy' or 'Hard'.
+    '''
+    while True:
+        difficulty = input("Select your Sudoku challenge level (Easy OR Hard): ")
+        difficulty = difficulty.replace(" ","")
+        if len(difficulty) == 4 and (('E' in difficulty[0] or 'e' in difficulty[0])
+                                     and ('A' in difficulty[1] or 'a' in difficulty[1])
+                                     and ('S' in difficulty[2] or 's' in difficulty[2])
+                                     and ('Y' in difficulty[3] or 'y' in difficulty[3])):
+            return 'Easy'
+        elif len(difficulty) == 4 and (('H' in difficulty[0] or 'h' in difficulty[0])
+                                       and ('A' in difficulty[1] or 'a' in difficulty[1])
+                                       and ('R' in difficulty[2] or 'r' in difficulty[2])
+                                       and ('D' in difficulty[3] or 'd' in difficulty[3])):
+            return 'Hard'
+
+def selectDifficulty(size):
+    '''
+    Asks the player for a difficulty and plays a game on a board of the given size.
+
+    Returns:
+        bool: True if the player finished the puzzle, False if they gave up.
+    '''
+    # Start making puzzles of this size while the player picks a difficulty
+    puzzlePool.warm(size, 'Easy')
+    puzzlePool.warm(size, 'Hard')
+    if readDifficulty() == 'Easy':
+        game = Game(filledInLetters(size, 'Easy'), 'Easy')
+        saveGame(game)
+        printBoard(game)
         print('''
 ================================= EASY Mode =================================
 
 RULES------------------------------------------------------------------------
-Letters A to D: Fill each row, column, and 2x2 box with letters from A to D.
+Letters {0} to {1}: Fill each row, column, and {2}x{3} box with letters from {0} to {1}.
 No Repeats: Every row, column, and box must have each letter exactly once.
 Hints: Hints are ALLOWED in this mode.
 -----------------------------------------------------------------------------
 You start with a few letters ALREADY filled in! Take your time and complete
-the grid using the rules. If you want to give up and leave the game, type
-'giveup'.
+the grid using the rules. Type 'h' for a hint, 'tip' to learn how to find
+the next letter, 'marks' to see the letters that fit in every empty cell, a
+letter to highlight it, 'undo' to take back your last letter, 'redo' to put
+it back, or 'giveup' to leave the game.
 
 -------------
 | GOODLUCK! |
--------------''')
-        filledInLetters()
-        printBoard()
-        userInputEASY()
-    elif len(difficulty) == 4 and (('H' in difficulty[0] or 'h' in difficulty[0])
-                                   and ('A' in difficulty[1] or 'a' in difficulty[1])
-                                   and ('R' in difficulty[2] or 'r' in difficulty[2])
-                                   and ('D' in difficulty[3] or 'd' in difficulty[3])):
+-------------'''.format(game.symbols[0], game.symbols[-1], game.board.boxRows, game.board.boxCols))
+        return userInputEASY(game)
+    else:
+        game = Game(filledInLetters(size, 'Hard'), 'Hard')
+        saveGame(game)
+        printBoard(game)
         print('''
 ================================= HARD Mode =================================
 
 RULES------------------------------------------------------------------------
-Letters A to D: Fill each row, column, and 2x2 box with letters from A to D
+Letters {0} to {1}: Fill each row, column, and {2}x{3} box with letters from {0} to {1}
 No Repeats: Every row, column, and box must have each letter exactly once.
 One Chance: You have only one chance to fill in a spot (NO SWITCHING LETTERS!).
 Hints: Hints are NOT allowed in this mode.
@@ -96,416 +172,372 @@ the grid using the rules. If you want to give up and leave the game, type
 
 -------------
 | GOODLUCK! |
--------------''')
-        filledInLetters()
-        printBoard()
-        userInputHARD()
-    else:
-        selectDifficulty()
+-------------'''.format(game.symbols[0], game.symbols[-1], game.board.boxRows, game.board.boxCols))
+        return userInputHARD(game)
 
-sudokuGrid = [['0','0','0','0'],['0','0','0','0'],['0','0','0','0'],['0','0','0','0']]
-alphabet = ['A','B','C','D']
-    
-def filledInLetters():
-    '''
-    Fills in the Sudoku grid with a set of random letters (A to D) in random positions,
-    ensuring that the initial setup does not violate any Sudoku rules.
-    '''
-    lettersInBoard = []
-    for value in alphabet:
-        randomNum = random.randint(0,3)
-        randomNum2 = random.randint(0,3)
-        
-        while sudokuGrid[randomNum][randomNum2] in alphabet:
-            randomNum = random.randint(0,3)
-            randomNum2 = random.randint(0,3)
-            
-        sudokuGrid[randomNum][randomNum2] = value
-        lettersInBoard.append(randomNum)
-        lettersInBoard.append(randomNum2)
-        
-    if not sudokuSolver(sudokuGrid):
-        lettersInBoard.clear()
-        filledInLetters()
-        
-    for row in range (4):
-        for col in range (4):
-            sudokuGrid[row][col] = '0'
-    while len(lettersInBoard) != 0:
-        for value in alphabet:
-            if len(lettersInBoard) != 0:
-                sudokuGrid[lettersInBoard.pop(0)][lettersInBoard.pop(0)] = value
-        
-def noRulesViolated(row, col, value):
+puzzleBanks = {}
+
+def openPuzzleBank(size, difficulty):
     '''
-    Checks if placing a value in the specified cell does not violate Sudoku rules.
+    Opens the pre-generated puzzle bank for the given board size and
+    difficulty, if there is one.
     
-    Parameters:
-        row (int): The row index.
-        col (int): The column index.
-        value (str): The letter value to place.
-        
     Returns:
-        bool: True if the placement is valid, False otherwise.
+        PuzzleBank: The bank, or None if there is no bank file.
     '''
-    if horizontalRuleViolated(row, col, value) or verticalRuleViolated(row, col, value) or squareRuleViolated(row, col, value):
-        return False
-    return True
+    path = bankPath(BANK_DIRECTORY, size, difficulty)
+    if path not in puzzleBanks:
+        puzzleBanks[path] = PuzzleBank(path) if os.path.exists(path) else None
+    return puzzleBanks[path]
 
-def sudokuSolver(sudokuGrid):
+def makePuzzle(size, difficulty):
     '''
-    Solves the Sudoku puzzle using a backtracking algorithm. Ensures that no 
-    Sudoku rules are violated in the process. This function is used to check 
-    if the puzzle setup is solvable.
+    Makes a new puzzle. The puzzle has exactly one solution and needs the
+    solving techniques that match the chosen difficulty (see
+    PuzzleGenerator). It is taken from a puzzle bank when one is available,
+    otherwise it is generated.
     
     Parameters:
-        sudokuGrid (list): A 2D list representing the Sudoku grid.
+        size (int): The board size.
+        difficulty (str): 'Easy' or 'Hard'.
         
     Returns:
-        bool: True if the puzzle is solvable, False otherwise.
+        Puzzle: The new puzzle.
     '''
-    emptyCell = findEmptyCells(sudokuGrid)
-    if not emptyCell:
-        return True # Puzzle is solved because no empty cells are found in the grid
-    
-    row = emptyCell[0]
-    col = emptyCell[1]
-    
-    for value in alphabet:
-        if noRulesViolated(row, col, value):
-            sudokuGrid[row][col] = value
-            
-            if sudokuSolver(sudokuGrid): # Recursively calls this function until the board is filled
-                return True
-            
-            sudokuGrid[row][col] = '0' # If the current placement doesn't lead to a solution, then we will backtrack
-    
-    return False # Triggers backtracking
+    bank = openPuzzleBank(size, difficulty)
+    if bank is not None and len(bank) > 0:
+        metrics.count('puzzles_total', 1, {'source': 'bank', 'size': size})
+        return bank.randomPuzzle(random)
+    metrics.count('puzzles_total', 1, {'source': 'generated', 'size': size})
+    return generatePuzzle(random.getrandbits(32), size, difficulty)
+
+# Puzzles made in the background while the player is busy (see PuzzlePool)
+puzzlePool = PuzzlePool(makePuzzle)
 
-def findEmptyCells(sudokuGrid):
+def filledInLetters(size, difficulty):
     '''
-    Finds the next empty cell (represented by '0') in the Sudoku grid.
-    
+    Picks the starting letters of a new puzzle, from the pool of puzzles
+    made ahead of time, and one the player has not had recently.
+
     Parameters:
-        sudokuGrid (list): A 2D list representing the Sudoku grid.
-        
+        size (int): The board size.
+        difficulty (str): 'Easy' or 'Hard'.
+
     Returns:
-        tuple: A tuple (row, col) representing the position of the empty cell, or 
-               None if no empty cell is found.
+        Puzzle: The new puzzle.
     '''
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            if sudokuGrid[row][col] == '0':
-                return row, col
-    return None
+    return puzzlePool.get(size, difficulty)
 
-    
-def printBoard():
+def saveGame(game):
+    'Saves the game in progress, when games are being saved.'
+    if store is not None:
+        store.save(PLAYER, game)
+        store.flush() # One player, so there is nothing to batch
+
+def forgetGame():
+    'Deletes the saved game once it is over.'
+    if store is not None:
+        store.delete(PLAYER)
+        store.flush()
+
+def resumeGame():
+    '''
+    Offers the player their saved game, if they have one, and plays it.
+
+    Returns:
+        bool: True if the player finished the saved puzzle, False if they
+              gave up, or None if no saved game was played.
+    '''
+    game = store.load(PLAYER) if store is not None else None
+    if game is None:
+        return None
+    answer = input("Welcome back! Do you want to finish your saved " + game.difficulty + " puzzle (Yes Or No): ")
+    if 'Y' not in answer and 'y' not in answer:
+        forgetGame()
+        return None
+    printBoard(game)
+    if game.difficulty == 'Easy':
+        return userInputEASY(game)
+    return userInputHARD(game)
+
+# Draws the board, rewriting only the cells that changed on a terminal
+renderer = TerminalRenderer()
+atexit.register(renderer.close)
+
+def printBoard(game):
     'Prints the current state of the Sudoku board with rows and columns labeled.'
-    print('''
-=================
- Sudoku For Kids
-=================
-    1 2 3 4
-   +-+-+-+-+
-   |{} {}|{} {}|
-   |{} {}|{} {}|
-   +-+-+-+-+
-   |{} {}|{} {}|
-   |{} {}|{} {}|
-   +-+-+-+-+'''.format(sudokuGrid[0][0], sudokuGrid[0][1], sudokuGrid[0][2], sudokuGrid[0][3],
-                       sudokuGrid[1][0], sudokuGrid[1][1], sudokuGrid[1][2], sudokuGrid[1][3],
-                       sudokuGrid[2][0], sudokuGrid[2][1], sudokuGrid[2][2], sudokuGrid[2][3],
-                       sudokuGrid[3][0], sudokuGrid[3][1], sudokuGrid[3][2], sudokuGrid[3][3]))
-    
-def horizontalRuleViolated(row, col, value):
+    renderer.show(game.board)
+
+# The command being handled and when it was read, for the command_seconds metric
+lastCommand = None
+
+def commandName(userInput):
+    'Returns what kind of command a line typed in the game loops is.'
+    command = userInput.replace(" ","")
+    if command == 'h':
+        return 'hint'
+    if command in ('undo', 'redo', 'marks', 'tip', 'giveup'):
+        return command
+    if len(command) == 1 and command.isalpha():
+        return 'highlight'
+    return 'place'
+
+def finishCommand():
+    'Records how long the command being handled took (with metrics on).'
+    global lastCommand
+    if lastCommand is not None:
+        metrics.observe('command_seconds', time.perf_counter() - lastCommand[1], {'command': lastCommand[0]})
+        lastCommand = None
+
+def readCommand(prompt, kind=None):
     '''
-    Checks if placing a value in the specified row violates the horizontal rule.
+    Reads a line in the game loops. With metrics on, it also records how long
+    the previous command took, from reading it to asking for the next line.
     
     Parameters:
-        row (int): The row index.
-        col (int): The column index.
-        value (str): The letter value to place.
-        
-    Returns:
-        bool: True if the horizontal rule is violated, False otherwise.
+        prompt (str): The text to show.
+        kind (str): What the line will be used for; worked out from the line
+                    itself if None.
     '''
-    for i in range (BOARD_SIZE):
-        if value in sudokuGrid[row][i] and i != col:
-            return True
-    return False
-
-def verticalRuleViolated(row, col, value):
+    global lastCommand
+    finishCommand()
+    userInput = input(prompt)
+    if metrics.sink is not None:
+        lastCommand = (kind or commandName(userInput), time.perf_counter())
+    return userInput
+
+def cellLetter(game, row, col):
+    'Returns the letter in the cell, or \'0\' if it is empty.'
+    value = game.board.get(row, col)
+    return game.symbols[value - 1] if value else '0'
+
+def parseMove(userInput):
     '''
-    Checks if placing a value in the specified column violates the vertical rule.
+    Reads a move typed by the player, either with spaces ("1 2 A", "10 12 P")
+    or squashed together on boards with single digit rows ("12A").
     
     Parameters:
-        row (int): The row index.
-        col (int): The column index.
-        value (str): The letter value to place.
+        userInput (str): The text the player typed.
         
     Returns:
-        bool: True if the vertical rule is violated, False otherwise.
+        tuple: (row, col, value) with zero-based row and column indexes.
     '''
-    for i in range (BOARD_SIZE):
-        if value in sudokuGrid[i][col] and i != row:
-            return True
-    return False
-
-def squareRuleViolated(row, col, value):
+    parts = userInput.split()
+    if len(parts) != 3:
+        parts = userInput.replace(" ","")
+        if len(parts) != 3:
+            raise ValueError("A move needs a row, a column and a letter")
+    return int(parts[0])-1, int(parts[1])-1, parts[2]
+
+def parseCell(userInput):
     '''
-    Checks if placing a value in the specified 2x2 square violates the square rule.
+    Reads a cell typed by the player, either as "1 2" or as "12".
     
-    Parameters:
-        row (int): The row index.
-        col (int): The column index.
-        value (str): The letter value to place.
-        
     Returns:
-        bool: True if the square rule is violated, False otherwise.
-    '''
-    if row % 2 == 0 and col % 2 == 0 and value in sudokuGrid[row + 1][col + 1]:
-        return True
-    elif row % 2 == 0 and col % 2 == 1 and value in sudokuGrid[row + 1][col - 1]:
-        return True
-    elif row % 2 == 1 and col % 2 == 0 and value in sudokuGrid[row - 1][col + 1]:
-        return True
-    elif row % 2 == 1 and col % 2 == 1 and value in sudokuGrid[row - 1][col - 1]:
-        return True
-    return False
-      
-def ViolationNotifier(row, col, value):
-    '''
-    Checks if placing a value in the specified cell violates any Sudoku rules (horizontal, vertical, or square).
-    If any rule is violated, it prompts the user to try again.
+        tuple: (row, col) as zero-based indexes.
+    '''
+    parts = userInput.split()
+    if len(parts) != 2:
+        parts = userInput.replace(" ","")
+        if len(parts) != 2:
+            raise ValueError("A cell needs a row and a column")
+    return int(parts[0])-1, int(parts[1])-1
+
+def ViolationNotifier(game, row, col, value):
+    '''
+    Tries to place a value in the specified cell. If it violates a Sudoku rule
+    (horizontal, vertical, or square), the player is told which one and
+    prompted to try again until a move is accepted.
 
     Parameters:
+        game (Game): The game being played.
         row (int): The row index.
         col (int): The column index.
         value (str): The letter value to place.
     '''
-    noRulesViolated = False    
-    
-    while not noRulesViolated:
-
-        noRulesViolated = True
-            
-        if horizontalRuleViolated(row, col, value) and noRulesViolated:
-            print('''
-===========================
- Horizontal rule violated.
- Do it again!
-===========================''')
-            printBoard()
-            userInput = input("Enter a row, column, and letter (e.g., 1 2 A): ")
-            row = int(userInput[0])-1
-            col = int(userInput[2])-1
-            value = userInput[4]
-            noRulesViolated = False
-            
-        if verticalRuleViolated(row, col, value) and noRulesViolated:
-            print('''
-===========================
- Vertical rule violated.
- Do it again!
-===========================''')
-            printBoard()
-            userInput = input("Enter a row, column, and letter (e.g., 1 2 A): ")
-            row = int(userInput[0])-1
-            col = int(userInput[2])-1
-            value = userInput[4]
-            noRulesViolated = False
-            
-        if squareRuleViolated(row, col, value) and noRulesViolated:
-            print('''
+    rule = game.move(row, col, game.letterValue(value))
+    while rule is not None:
+        print('''
 ===========================
- Square rule violated.
+ {} rule violated.
  Do it again!
-===========================''')
-            printBoard()
-            userInput = input("Enter a row, column, and letter (e.g., 1 2 A): ")
-            row = int(userInput[0])-1
-            col = int(userInput[2])-1
-            value = userInput[4]
-            noRulesViolated = False 
-    sudokuGrid[row][col] = Red + value + Normal
+==========================='''.format(RULE_NAMES[rule]))
+        printBoard(game)
+        userInput = readCommand("Enter a row, column, and letter (e.g., 1 2 A): ", 'place')
+        row, col, value = parseMove(userInput)
+        rule = game.move(row, col, game.letterValue(value))
 
-def hint():
+def hint(game):
     '''
     Provides a hint by showing possible values for a specified cell that do not violate Sudoku rules.
     '''
     print(Red + "================================= HINT =================================")
 
     userInput = input(Red + "Type the row and column number of the cell you want a hint (e.g., 1 2): " + Normal)
-    userInput = userInput.replace(" ","")
-    row = int(userInput[0])-1
-    col = int(userInput[1])-1
+    row, col = parseCell(userInput)
     
-    while (row or col) < BOARD_START_INDEX or (row or col) > BOARD_END_INDEX:
+    while (row or col) < BOARD_START_INDEX or (row or col) > game.size - 1:
         print(Red + "Enter a valid row and column!" + Normal)
         userInput = input(Red + "Type the row and column number of the cell you want a hint (e.g., 1 2): " + Normal)
-        userInput = userInput.replace(" ","")
-        row = int(userInput[0])-1
-        col = int(userInput[1])-1
+        row, col = parseCell(userInput)
 
-    possibleValues = []
-    
-    currentValue = sudokuGrid[row][col]
-    
-    for letter in alphabet:
-        if not(horizontalRuleViolated(row, col, letter) or verticalRuleViolated(row, col, letter) or squareRuleViolated(row, col, letter)):
-            possibleValues.append(letter)
+    possibleValues = [game.symbols[value - 1] for value in game.hint(row, col)]
 
-    sudokuGrid[row][col] = currentValue
-    print("The possible values for the cell (1,2) are " + Background_Purple + str(possibleValues) + Normal)
+    print("The possible values for the cell (" + str(row + 1) + "," + str(col + 1) + ") are "
+          + Background_Purple + str(possibleValues) + Normal)
 
-def highlight(value):
+def tip(game):
+    '''
+    Explains, step by step, how to work out the next letter.
+    '''
+    print(Red + "================================== TIP ==================================" + Normal)
+    for step in game.tip():
+        print(" " + step.text)
+
+def pencilMarks(game):
+    '''
+    Shows the letters that still fit in every empty cell, row by row.
+    '''
+    print(Red + "============================= PENCIL MARKS =============================" + Normal)
+    marks = game.pencilMarks()
+    for row in range(game.size):
+        cells = ["(" + str(row + 1) + "," + str(col + 1) + ") " + "".join(game.symbols[value - 1] for value in values)
+                 for (markRow, col), values in sorted(marks.items()) if markRow == row]
+        if cells:
+            print("   " + "  ".join(cells))
+
+def highlight(game, value):
     '''
     Highlights all occurrences of a specified value on the Sudoku board.
     
     Parameters:
+        game (Game): The game being played.
         value (str): The letter value to highlight.
     '''
-    for letter in alphabet:
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):  
-                if sudokuGrid[row][col] == Red + letter + Normal:
-                    sudokuGrid[row][col] = letter + Normal
-                        
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):  
-            if sudokuGrid[row][col] == value:
-                sudokuGrid[row][col] = Bold_Yellow + Background_Red + value + Normal
-            elif sudokuGrid[row][col] == value + Normal:
-                sudokuGrid[row][col] = Bold_Yellow + Background_Red + value + Normal + Normal
-                
-    printBoard()
-
-    for letter in alphabet:
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):  
-                if sudokuGrid[row][col] == letter + Normal:
-                    sudokuGrid[row][col] = Red + letter + Normal
-
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):  
-            if sudokuGrid[row][col] == Bold_Yellow + Background_Red + value + Normal:
-                sudokuGrid[row][col] = value
-            elif sudokuGrid[row][col] == Bold_Yellow + Background_Red + value + Normal + Normal:
-                sudokuGrid[row][col] = Red + value + Normal
+    game.highlight(game.letterValue(value))
+    printBoard(game)
+    game.highlight(0)
                         
-def userInputEASY():
+def userInputEASY(game):
     '''
     Handles user input in Easy mode. Checks for rule violations and allows the 
     user to place letters on the Sudoku board with hints available.
+
+    Returns:
+        bool: True if the puzzle was finished, False if the player gave up.
     '''
-    emptyCells = 1
+    alphabet = game.symbols
+    boardEndIndex = game.size - 1
+    emptyCells = game.board.emptyCount
     while emptyCells > 0:
         try:
-            userInput = input("Enter a row, column, and letter (e.g., 1 2 A): ")
-            userInput = userInput.replace(" ","")
+            userInput = readCommand("Enter a row, column, and letter (e.g., 1 2 A): ")
+            command = userInput.replace(" ","")
 
-            if userInput == 'h':
-                hint()
+            if command == 'h':
+                hint(game)
+                continue
+
+            elif command in alphabet :
+                highlight(game, command)
+                continue
+            
+            elif command == 'tip':
+                tip(game)
+                continue
+            
+            elif command == 'marks':
+                pencilMarks(game)
+                continue
+            
+            elif command == 'undo':
+                if not game.undo():
+                    print(Red + "There is nothing to undo!" + Normal)
+                saveGame(game)
+                printBoard(game)
                 continue
 
-            elif userInput in alphabet :
-                highlight(userInput)
+            elif command == 'redo':
+                if not game.redo():
+                    print(Red + "There is nothing to redo!" + Normal)
+                saveGame(game)
+                printBoard(game)
                 continue
             
-            elif userInput == 'giveup':
+            elif command == 'giveup':
                 break
                 
-            row = int(userInput[0])-1
-            col = int(userInput[1])-1
-            value = userInput[2]
-
-            #Has to be placed here because if I place it up, commands like 'giveup' will mess up the meaning behind this try and except code because userInput[3] exists (e in giveup)
-            try:  
-                if userInput[3]:
-                    print("Enter a valid letter (A,B,C,D)!")
-                    continue
-            except:
-                pass
+            #Anything that is not a command has to be a move; parseMove rejects extra letters (like the e in giveup) so they end up in the except below
+            row, col, value = parseMove(userInput)
             
-            while (row or col) < 0 or (row or col) > 3 or value not in alphabet or sudokuGrid[row][col] == value:
-                if row < BOARD_START_INDEX or row > BOARD_END_INDEX:
-                    print(Red + "Enter a valid row (1-4)!" + Normal)
-                if col < BOARD_START_INDEX or col > BOARD_END_INDEX:
-                    print(Red + "Enter a valid column (1-4)!" + Normal)
+            while (row or col) < 0 or (row or col) > boardEndIndex or value not in alphabet or cellLetter(game, row, col) == value:
+                if row < BOARD_START_INDEX or row > boardEndIndex:
+                    print(Red + "Enter a valid row (1-" + str(game.size) + ")!" + Normal)
+                if col < BOARD_START_INDEX or col > boardEndIndex:
+                    print(Red + "Enter a valid column (1-" + str(game.size) + ")!" + Normal)
                 if value not in alphabet:
-                    print(Red + "Enter a valid letter (A,B,C,D)!" + Normal)
-                if sudokuGrid[row][col] == value:
+                    print(Red + "Enter a valid letter (" + ",".join(alphabet) + ")!" + Normal)
+                if cellLetter(game, row, col) == value:
                     print(Red + "SAME LETTER: Pick a letter different from the one currently in cell (row:", row + 1, "column:" + str(col + 1) + ")!" + Normal)
 
-                userInput = input("Enter a row, column, and letter (e.g., 1 2 A)2: ")
-                userInput = userInput.replace(" ","")
-                row = int(userInput[0])-1
-                col = int(userInput[1])-1
-                value = userInput[2]
+                userInput = readCommand("Enter a row, column, and letter (e.g., 1 2 A)2: ", 'place')
+                row, col, value = parseMove(userInput)
                   
-            ViolationNotifier(row, col, value)
-            emptyCells = 0
-            for row in sudokuGrid:
-                for col in row:
-                    if col == '0':
-                        emptyCells += 1
-            printBoard()
+            ViolationNotifier(game, row, col, value)
+            saveGame(game)
+            emptyCells = game.board.emptyCount
+            printBoard(game)
+        except MoveError as error:
+            print(Red + str(error) + Normal)
         except:
             print(Red + "Enter a valid row, column, and letter!3" + Normal )
-    if emptyCells == 0:
-        winGame()
-    else:
-        print("Bye for now, Sudoku Explorer!")
-        sys.exit(0)
+    finishCommand()
+    forgetGame()
+    return emptyCells == 0
     
-def userInputHARD():
+def userInputHARD(game):
     '''
     Handles user input in Hard mode. Checks for rule violations and allows the 
     user to place letters on the Sudoku board with no hints available.
+
+    Returns:
+        bool: True if the puzzle was finished, False if the player gave up.
     '''
-    emptyCells = 1
+    alphabet = game.symbols
+    boardEndIndex = game.size - 1
+    emptyCells = game.board.emptyCount
     while emptyCells != 0:
         try:
-            userInput = input("Enter a row, column, and letter (e.g., 1 2 A): ")
-            userInput = userInput.replace(" ","")
+            userInput = readCommand("Enter a row, column, and letter (e.g., 1 2 A): ")
 
-            if userInput == 'giveup':
+            if userInput.replace(" ","") == 'giveup':
                 break
             
-            row = int(userInput[0])-1
-            col = int(userInput[1])-1
-            value = userInput[2]
+            row, col, value = parseMove(userInput)
                 
-            while (row or col) < 0 or (row or col) > 3 or value not in alphabet or sudokuGrid[row][col] != '0':
-                if row < BOARD_START_INDEX or row > BOARD_END_INDEX:
-                    print(Red + "Enter a valid row (1-4)!" + Normal)
-                if col < BOARD_START_INDEX or col > BOARD_END_INDEX:
-                    print(Red + "Enter a valid column (1-4)!" + Normal)
+            while (row or col) < 0 or (row or col) > boardEndIndex or value not in alphabet or game.board.get(row, col) != 0:
+                if row < BOARD_START_INDEX or row > boardEndIndex:
+                    print(Red + "Enter a valid row (1-" + str(game.size) + ")!" + Normal)
+                if col < BOARD_START_INDEX or col > boardEndIndex:
+                    print(Red + "Enter a valid column (1-" + str(game.size) + ")!" + Normal)
                 if value not in alphabet:
-                    print(Red + "Enter a valid letter (A,B,C,D)!" + Normal)
-                if sudokuGrid[row][col] != 0:
+                    print(Red + "Enter a valid letter (" + ",".join(alphabet) + ")!" + Normal)
+                if game.board.get(row, col) != 0:
                     print(Red + "FULL: Pick a cell that is empty!" + Normal)
-                userInput = input("Enter a row, column, and letter (e.g., 1 2 A): ")
-                userInput = userInput.replace(" ","")
-                row = int(userInput[0])-1
-                col = int(userInput[1])-1
-                value = userInput[2]
+                userInput = readCommand("Enter a row, column, and letter (e.g., 1 2 A): ")
+                row, col, value = parseMove(userInput)
                   
-            ViolationNotifier(row, col, value)
-            emptyCells = 0
-            for row in sudokuGrid:
-                for col in row:
-                    if col == '0':
-                        emptyCells += 1
-            printBoard()
+            ViolationNotifier(game, row, col, value)
+            saveGame(game)
+            emptyCells = game.board.emptyCount
+            printBoard(game)
+        except MoveError as error:
+            print(Red + str(error) + Normal)
         except:
             print(Red + "Enter a valid row, column, and letter!" + Normal )
-    if emptyCells == 0:
-        winGame()
-    else:
-        print("Bye for now, Sudoku Explorer!")
-        sys.exit(0)
+    finishCommand()
+    forgetGame()
+    return emptyCells == 0
     
 def winGame():
     '''
@@ -515,23 +547,44 @@ def winGame():
 =============================================================================
  Congratulations, Sudoku Explorer! You've completed your Sudoku Adventure \U0001F31F
 =============================================================================''')
-    playAnotherGame()
     
 def playAnotherGame():
     '''
-    Asks the player if they want to play another Sudoku game. If yes, restarts the game.
-    If no, exits the game.
+    Asks the player if they want to play another Sudoku game.
+
+    Returns:
+        bool: True for another game, False to stop.
+    '''
+    while True:
+        playAgain = input("Do you want to EXPLORE another Sudoku Puzzle (Yes Or No): ")
+        if 'Y' in playAgain or 'y' in playAgain:
+            return True
+        elif 'N' in playAgain or 'n' in playAgain:
+            return False
+
+def playGames():
     '''
-    playAgain = input("Do you want to EXPLORE another Sudoku Puzzle (Yes Or No): ")
-    if 'Y' in playAgain or 'y' in playAgain:
+    Plays games until the player gives up or wants no more. Each game
+    returns here when it ends, so a session can go on for any number of
+    games without the call stack growing.
+    '''
+    gameHeader()
+    solved = resumeGame()
+    if solved is None:
+        solved = selectDifficulty(selectBoardSize())
+    while solved:
+        winGame()
+        if not playAnotherGame():
+            break
         gameHeader()
-        selectDifficulty()
-    elif 'N' in playAgain or 'n' in playAgain:
-        print("Bye for now, Sudoku Explorer!")
-        sys.exit(0)
-    else:
-        playAnotherGame()
+        solved = selectDifficulty(selectBoardSize())
+    print("Bye for now, Sudoku Explorer!")
 
 # Start the game
-gameHeader()
-selectDifficulty()
+if __name__ == '__main__':
+    if os.environ.get('KIDSUDOKU_METRICS'):
+        installMetrics(os.environ['KIDSUDOKU_METRICS'])
+    if os.environ.get('KIDSUDOKU_SAVE'):
+        store = SessionStore(os.environ['KIDSUDOKU_SAVE'])
+        PLAYER = loginName()
+    playGames()
@@ -0,0 +1,452 @@
+'''
+Network game server: many players, each with their own game, over a simple
+line protocol on TCP or a Unix socket.
+
+Every connection is one session holding one Game (see SudokuGame). The
+client sends one command per line and gets exactly one line back:
+
+    new [size] [difficulty]   GAME <size> <difficulty> <cells>
+    login <player>            GAME ... with the player's saved game, or OK
+    board                     BOARD <cells>
+    place <row> <col> <letter>
+                              OK, OK SOLVED, or RULE <horizontal|vertical|square>
+    undo                      OK, or ERR ... if there is nothing to undo
+    redo                      OK, or ERR ... if there is nothing to redo
+    hint <row> <col>          HINT <letters...>
+    tip                       TIP <how to find the next letter>
+    marks                     MARKS <row>,<col>:<letters> ... for every empty cell
+    singles                   CELLS <row>,<col> ... where only one letter fits
+    highlight <letter>        CELLS <row>,<col> ...
+    giveup                    BYE (and the connection is closed)
+
+Rows and columns count from 1, as on screen, and <cells> is the board row by
+row with "." for empty cells. Anything the game refuses is answered with
+"ERR <message>". A session with no game yet starts one on its first command
+other than "new", with the server's default size and difficulty.
+
+With a session store (--store), a session that logs in has its game saved
+after every change and deleted once it is solved or given up, and logging
+in again, even after the server restarts, carries on with it. Saves are
+written by one transaction per FLUSH_INTERVAL for all the sessions (see
+SessionStore), in a worker thread.
+
+Commands are handled straight from the event loop, since a move, hint or
+highlight is a few bitset operations. Making a puzzle is the one slow step,
+so it runs in a pool of worker processes (--workers), where it neither
+blocks the event loop nor competes with it for the interpreter lock. If a
+worker dies, the pool is replaced. Sessions that stay quiet for longer than
+the idle timeout are closed, lines longer than the read limit are refused,
+every reply waits for the socket to drain before the next line is read (so
+a client that does not read its replies stops being served rather than
+filling the server's memory), and connections over the session limit are
+turned away.
+
+Usage:
+    python GameServer.py --port 8765
+    python GameServer.py --unix /tmp/kidsudoku.sock --idle-timeout 60
+    python GameServer.py --store sessions.db
+'''
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import resource
+import signal
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from BatchGenerate import cellsToText
+from Metrics import PrometheusSink, install as installMetrics, metrics
+from PuzzleGenerator import DIFFICULTIES, generatePuzzle
+from SessionStore import FLUSH_INTERVAL, SessionStore
+from SudokuBoard import BOX_SHAPES
+from SudokuGame import Game, MoveError
+
+DEFAULT_PORT = 8765
+IDLE_TIMEOUT = 300     # Seconds a session may stay quiet
+MAX_SESSIONS = 20000
+LINE_LIMIT = 256       # Longest command line accepted, in bytes
+WRITE_HIGH_WATER = 64 * 1024
+METRICS_INTERVAL = 10  # Seconds between dumps of a Prometheus metrics file
+
+# Commands answered by handleCommand, used as metric labels (anything else is 'unknown')
+COMMANDS = ('place', 'hint', 'tip', 'marks', 'singles', 'highlight', 'undo', 'redo', 'board', 'giveup')
+
+# Commands that change the game, so a logged-in session saves it afterwards
+CHANGES = ('place', 'undo', 'redo')
+
+def raiseFileLimit(wanted):
+    'Allows enough open files for the connections, as far as the system permits.'
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        if hard != resource.RLIM_INFINITY:
+            wanted = min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+class Session:
+    'The state of one connected player.'
+
+    def __init__(self, number, writer, size=4, difficulty='Easy'):
+        self.number = number
+        self.writer = writer
+        self.size = size
+        self.difficulty = difficulty
+        self.game = None
+        self.player = None # Set by "login"
+        self.commands = 0
+        self.lastActive = 0.0
+
+def parseNumber(text, name):
+    if not text.isdigit():
+        raise MoveError('%s must be a number' % name)
+    return int(text) - 1
+
+def handleCommand(session, line):
+    '''
+    Runs one protocol command against a session and returns the reply line
+    (without the newline). Never blocks; "new" is handled by the server.
+
+    Parameters:
+        session (Session): The player's session; it must have a game.
+        line (str): The command line sent by the player.
+
+    Returns:
+        str: The reply.
+    '''
+    words = line.split()
+    if not words:
+        return 'ERR empty command'
+    command, args = words[0].lower(), words[1:]
+    game = session.game
+    session.commands += 1
+    try:
+        if command == 'place':
+            if len(args) != 3:
+                return 'ERR usage: place <row> <col> <letter>'
+            row = parseNumber(args[0], 'row')
+            col = parseNumber(args[1], 'column')
+            rule = game.move(row, col, game.letterValue(args[2].upper()))
+            if rule is not None:
+                return 'RULE ' + rule
+            return 'OK SOLVED' if game.isSolved() else 'OK'
+        if command == 'hint':
+            if len(args) != 2:
+                return 'ERR usage: hint <row> <col>'
+            values = game.hint(parseNumber(args[0], 'row'), parseNumber(args[1], 'column'))
+            return ' '.join(['HINT'] + [game.symbols[value - 1] for value in values])
+        if command == 'tip':
+            return ' '.join(['TIP'] + [step.text for step in game.tip()])
+        if command == 'marks':
+            marks = ['%d,%d:%s' % (row + 1, col + 1, ''.join(game.symbols[value - 1] for value in values))
+                     for (row, col), values in sorted(game.pencilMarks().items())]
+            return ' '.join(['MARKS'] + marks)
+        if command == 'singles':
+            return ' '.join(['CELLS'] + ['%d,%d' % (row + 1, col + 1) for row, col in game.singles()])
+        if command == 'highlight':
+            if len(args) != 1:
+                return 'ERR usage: highlight <letter>'
+            mask = game.board.valueCells[game.letterValue(args[0].upper())]
+            cells = []
+            while mask:
+                index = (mask & -mask).bit_length() - 1
+                cells.append('%d,%d' % (index // game.size + 1, index % game.size + 1))
+                mask &= mask - 1
+            return ' '.join(['CELLS'] + cells)
+        if command == 'undo':
+            return 'OK' if game.undo() else 'ERR nothing to undo'
+        if command == 'redo':
+            return 'OK' if game.redo() else 'ERR nothing to redo'
+        if command == 'board':
+            return 'BOARD ' + cellsToText(game.board.cells, game.size)
+        if command == 'giveup':
+            return 'BYE'
+        return 'ERR unknown command %r' % command
+    except MoveError as error:
+        return 'ERR ' + str(error)
+
+def parseNew(session, args):
+    '''
+    Reads the arguments of a "new" command.
+
+    Returns:
+        tuple: (size, difficulty)
+    '''
+    size, difficulty = session.size, session.difficulty
+    for arg in args:
+        if arg.isdigit() and int(arg) in BOX_SHAPES:
+            size = int(arg)
+        elif arg.capitalize() in DIFFICULTIES:
+            difficulty = arg.capitalize()
+        else:
+            raise MoveError('usage: new [%s] [%s]' % ('|'.join(map(str, sorted(BOX_SHAPES))),
+                                                      '|'.join(DIFFICULTIES)))
+    return size, difficulty
+
+class GameServer:
+    '''
+    Hosts game sessions over TCP or a Unix socket.
+
+    Parameters:
+        size (int): Board size of games started without a size.
+        difficulty (str): Difficulty of games started without one.
+        idleTimeout (float): Seconds before a quiet session is closed.
+        maxSessions (int): Most sessions open at once.
+        store (SessionStore): Where logged-in players' games are saved
+                              (None to save nothing).
+        workers (int): Processes making puzzles (defaults to the CPU count).
+    '''
+
+    def __init__(self, size=4, difficulty='Easy', idleTimeout=IDLE_TIMEOUT, maxSessions=MAX_SESSIONS,
+                 store=None, workers=None):
+        self.size = size
+        self.difficulty = difficulty
+        self.idleTimeout = idleTimeout
+        self.maxSessions = maxSessions
+        self.store = store
+        self.workers = workers or os.cpu_count() or 1
+        self.sessions = {}
+        self.started = 0
+        self.server = None
+        self.reaper = None
+        self.flusher = None
+        self.generator = None
+
+    def newGenerator(self):
+        'Returns a new pool of processes for making puzzles.'
+        # Spawned rather than forked, since the server already runs threads
+        return ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'))
+
+    async def newGame(self, size, difficulty):
+        '''
+        Makes a puzzle in a worker process so the event loop keeps serving.
+        A pool broken by a worker dying (killed for using too much memory,
+        say) never recovers, so it is replaced and the puzzle asked for once
+        more.
+        '''
+        loop = asyncio.get_running_loop()
+        seed = random.getrandbits(32)
+        for attempt in range(2):
+            generator = self.generator
+            try:
+                puzzle = await loop.run_in_executor(generator, generatePuzzle, seed, size, difficulty)
+                return Game(puzzle, difficulty)
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                # Sessions waiting on the same pool all get here; the first replaces it
+                if self.generator is generator:
+                    generator.shutdown(wait=False, cancel_futures=True)
+                    self.generator = self.newGenerator()
+                    metrics.count('generator_restarts_total')
+
+    async def startGame(self, session):
+        '''
+        Gives a session a new game of its size and difficulty.
+
+        Returns:
+            str: None, or the ERR reply if no puzzle could be made.
+        '''
+        try:
+            session.game = await self.newGame(session.size, session.difficulty)
+        except Exception:
+            traceback.print_exc()
+            metrics.count('new_game_errors_total')
+            return 'ERR could not make a puzzle, please try again'
+        return None
+
+    async def login(self, session, args):
+        'Handles "login": remembers the player and carries on their saved game.'
+        if len(args) != 1:
+            return 'ERR usage: login <player>'
+        if self.store is None:
+            return 'ERR games are not saved on this server'
+        session.player = args[0]
+        loop = asyncio.get_running_loop()
+        game = await loop.run_in_executor(None, self.store.load, session.player)
+        if game is None:
+            if session.game is not None:
+                self.store.save(session.player, session.game)
+            return 'OK'
+        session.game = game
+        session.size, session.difficulty = game.size, game.difficulty
+        return 'GAME %d %s %s' % (game.size, game.difficulty, cellsToText(game.board.cells, game.size))
+
+    async def reply(self, writer, text):
+        writer.write(text.encode() + b'\n')
+        await writer.drain()
+
+    async def handleClient(self, reader, writer):
+        if len(self.sessions) >= self.maxSessions:
+            writer.write(b'ERR server full\n')
+            writer.close()
+            return
+        writer.transport.set_write_buffer_limits(WRITE_HIGH_WATER)
+        loop = asyncio.get_running_loop()
+        self.started += 1
+        session = Session(self.started, writer, self.size, self.difficulty)
+        self.sessions[session.number] = session
+        try:
+            while True:
+                session.lastActive = loop.time()
+                try:
+                    line = await reader.readline()
+                except ValueError: # Longer than LINE_LIMIT
+                    await self.reply(writer, 'ERR line too long')
+                    break
+                if not line:
+                    break
+                text = line.decode('ascii', 'replace').strip()
+                words = text.split()
+                if words and words[0].lower() == 'new':
+                    try:
+                        session.size, session.difficulty = parseNew(session, words[1:])
+                    except MoveError as error:
+                        await self.reply(writer, 'ERR ' + str(error))
+                        continue
+                    failed = await self.startGame(session)
+                    if failed:
+                        await self.reply(writer, failed)
+                        continue
+                    if session.player is not None:
+                        self.store.save(session.player, session.game)
+                    await self.reply(writer, 'GAME %d %s %s' % (session.size, session.difficulty,
+                                                                cellsToText(session.game.board.cells, session.size)))
+                    continue
+                if words and words[0].lower() == 'login':
+                    await self.reply(writer, await self.login(session, words[1:]))
+                    continue
+                if session.game is None:
+                    failed = await self.startGame(session)
+                    if failed:
+                        await self.reply(writer, failed)
+                        continue
+                if metrics.sink is not None:
+                    started = time.perf_counter()
+                    answer = handleCommand(session, text)
+                    command = words[0].lower() if words else ''
+                    metrics.observe('command_seconds', time.perf_counter() - started,
+                                    {'command': command if command in COMMANDS else 'unknown'})
+                else:
+                    answer = handleCommand(session, text)
+                if session.player is not None:
+                    if answer in ('OK SOLVED', 'BYE'):
+                        self.store.delete(session.player)
+                    elif answer == 'OK' and words[0].lower() in CHANGES:
+                        self.store.save(session.player, session.game)
+                await self.reply(writer, answer)
+                if answer == 'BYE':
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            del self.sessions[session.number]
+            writer.close()
+
+    async def reapIdle(self):
+        '''
+        Closes sessions that have sent nothing for idleTimeout seconds. One
+        sweep now and then is far cheaper than a timer on every read.
+        '''
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(max(self.idleTimeout / 4, 0.1))
+            cutoff = loop.time() - self.idleTimeout
+            for session in list(self.sessions.values()):
+                if session.lastActive < cutoff and not session.writer.is_closing():
+                    session.writer.write(b'BYE idle\n')
+                    session.writer.close()
+
+    async def flushSessions(self):
+        '''
+        Writes the saved games every FLUSH_INTERVAL seconds, in a worker
+        thread. A failed flush is reported and its games are written by the
+        next one.
+        '''
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                batch = self.store.takePending() # Read the games here, where they are played
+                await loop.run_in_executor(None, self.store.write, batch)
+            except Exception:
+                traceback.print_exc()
+                metrics.count('store_errors_total')
+
+    async def dumpMetrics(self, path):
+        'Rewrites a Prometheus metrics file every METRICS_INTERVAL seconds.'
+        while True:
+            await asyncio.sleep(METRICS_INTERVAL)
+            metrics.sink.dump(path)
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT, path=None):
+        'Starts listening; on a Unix socket if path is given.'
+        self.generator = self.newGenerator()
+        self.reaper = asyncio.ensure_future(self.reapIdle())
+        if self.store is not None:
+            self.flusher = asyncio.ensure_future(self.flushSessions())
+        if path:
+            self.server = await asyncio.start_unix_server(self.handleClient, path, limit=LINE_LIMIT,
+                                                          backlog=4096)
+        else:
+            self.server = await asyncio.start_server(self.handleClient, host, port, limit=LINE_LIMIT,
+                                                     backlog=4096)
+        return self.server
+
+    async def serveForever(self, host='127.0.0.1', port=DEFAULT_PORT, path=None, metricsPath=None):
+        server = await self.start(host, port, path)
+        if metricsPath and isinstance(metrics.sink, PrometheusSink):
+            asyncio.ensure_future(self.dumpMetrics(metricsPath))
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        'Stops the processes making puzzles.'
+        if self.generator is not None:
+            self.generator.shutdown(cancel_futures=True)
+            self.generator = None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Host Sudoku games over the network.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='TCP port (default %d)' % DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--size', type=int, default=4, choices=sorted(BOX_SHAPES),
+                        help='board size of new games (default 4)')
+    parser.add_argument('--difficulty', default='Easy', choices=DIFFICULTIES,
+                        help='difficulty of new games (default Easy)')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='seconds before a quiet session is closed (default %d)' % IDLE_TIMEOUT)
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='record metrics to this file (Prometheus text if it ends in .prom, else JSON lines)')
+    parser.add_argument('--store', metavar='PATH',
+                        help='save the games of logged-in players in this SQLite file')
+    parser.add_argument('--max-sessions', type=int, default=MAX_SESSIONS,
+                        help='most sessions open at once (default %d)' % MAX_SESSIONS)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes making puzzles (default: one per CPU)')
+    args = parser.parse_args(argv)
+    raiseFileLimit(args.max_sessions + 100)
+    store = SessionStore(args.store) if args.store else None
+    server = GameServer(args.size, args.difficulty, args.idle_timeout, args.max_sessions, store,
+                        args.workers)
+    if args.metrics:
+        installMetrics(args.metrics)
+    print('Serving on %s' % (args.unix or '%s:%d' % (args.host, args.port)), file=sys.stderr)
+    # Stop on a kill as on Ctrl+C, so the worker processes are stopped and saves flushed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(server.serveForever(args.host, args.port, args.unix, args.metrics))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if store is not None:
+            store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+'''
+Load test for GameServer: many simulated players at once.
+
+Every player opens its own connection, and once all of them are connected
+they start a game, ask for a hint and a highlight, fill in the whole board
+(solving it locally) and give up. The time from sending each command to
+reading its reply is recorded, and the report shows the throughput and the
+50th and 99th percentile latencies per command.
+
+Usage:
+    python GameServer.py --port 8765 &
+    python LoadTest.py --players 10000 --port 8765
+'''
+
+import argparse
+import asyncio
+import sys
+import time
+
+from GameServer import raiseFileLimit
+from Metrics import percentile
+from SudokuBoard import BOX_SHAPES, symbolsFor
+from SudokuSolver import solveCells
+
+class Player:
+    'One simulated player with its own connection.'
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+        self.reader = None
+        self.writer = None
+
+    async def connect(self, host, port, path):
+        if path:
+            self.reader, self.writer = await asyncio.open_unix_connection(path)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    async def send(self, command):
+        start = time.perf_counter()
+        self.writer.write(command.encode() + b'\n')
+        line = await self.reader.readline()
+        self.latencies.setdefault(command.split()[0], []).append(time.perf_counter() - start)
+        if not line:
+            raise ConnectionError('server closed the connection')
+        return line.decode().rstrip('\n')
+
+    async def play(self, size, difficulty):
+        reply = await self.send('new %d %s' % (size, difficulty))
+        if not reply.startswith('GAME'):
+            raise RuntimeError(reply)
+        symbols = symbolsFor(size)
+        cells = [0 if letter == '.' else symbols.index(letter) + 1 for letter in reply.split()[3]]
+        solution = solveCells(cells, *BOX_SHAPES[size])
+        empty = [index for index, value in enumerate(cells) if not value]
+        if difficulty == 'Easy':
+            await self.send('hint %d %d' % (empty[0] // size + 1, empty[0] % size + 1))
+        await self.send('highlight A')
+        for index in empty:
+            reply = await self.send('place %d %d %s' % (index // size + 1, index % size + 1,
+                                                         symbols[solution[index] - 1]))
+            if not reply.startswith('OK'):
+                raise RuntimeError(reply)
+        await self.send('giveup')
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+async def runPlayer(player, args, connected, go, failures):
+    try:
+        await player.connect(args.host, args.port, args.unix)
+    except OSError as error:
+        failures.append('connect: %s' % error)
+        connected()
+        return
+    connected()
+    await go.wait()
+    try:
+        await player.play(args.size, args.difficulty)
+    except (OSError, RuntimeError) as error:
+        failures.append(str(error))
+    finally:
+        player.close()
+
+async def loadTest(args):
+    '''
+    Runs the load test.
+
+    Returns:
+        dict: Latency samples per command, failures, the number of players
+              and the time spent playing.
+    '''
+    latencies = {}
+    failures = []
+    go = asyncio.Event()
+    waiting = [args.players]
+    def connected():
+        waiting[0] -= 1
+        if not waiting[0]:
+            go.set()
+    players = [Player(latencies) for _ in range(args.players)]
+    tasks = []
+    for player in players:
+        tasks.append(asyncio.ensure_future(runPlayer(player, args, connected, go, failures)))
+        if len(tasks) % 500 == 0:
+            await asyncio.sleep(0) # Let the server accept before the backlog fills
+    await go.wait()
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return {'latencies': latencies, 'failures': failures, 'players': args.players,
+            'elapsed': time.perf_counter() - start}
+
+def report(result, output=sys.stdout):
+    'Prints the throughput and latency percentiles.'
+    latencies = result['latencies']
+    total = sum(len(samples) for samples in latencies.values())
+    elapsed = result['elapsed']
+    print('%d players, %d commands in %.2f s (%.0f commands/s), %d failures'
+          % (result['players'], total, elapsed, total / elapsed if elapsed else 0,
+             len(result['failures'])), file=output)
+    print('%-10s %8s %10s %10s %10s' % ('command', 'count', 'p50 ms', 'p99 ms', 'max ms'), file=output)
+    everything = []
+    for command in sorted(latencies):
+        samples = latencies[command]
+        everything.extend(samples)
+        print('%-10s %8d %10.3f %10.3f %10.3f' % (command, len(samples), percentile(samples, 0.5) * 1000,
+                                                  percentile(samples, 0.99) * 1000, max(samples) * 1000),
+              file=output)
+    if everything:
+        print('%-10s %8d %10.3f %10.3f %10.3f' % ('all', len(everything), percentile(everything, 0.5) * 1000,
+                                                  percentile(everything, 0.99) * 1000, max(everything) * 1000),
+              file=output)
+    for failure in result['failures'][:5]:
+        print('  failed: ' + failure, file=output)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test a GameServer.')
+    parser.add_argument('--players', type=int, default=10000, help='simulated players (default 10000)')
+    parser.add_argument('--host', default='127.0.0.1', help='server address (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='server TCP port (default 8765)')
+    parser.add_argument('--unix', metavar='PATH', help='connect to a Unix socket instead of TCP')
+    parser.add_argument('--size', type=int, default=4, choices=sorted(BOX_SHAPES),
+                        help='board size (default 4)')
+    parser.add_argument('--difficulty', default='Easy', choices=('Easy', 'Hard'),
+                        help='difficulty (default Easy)')
+    args = parser.parse_args(argv)
+    raiseFileLimit(args.players + 100)
+    report(asyncio.run(loadTest(args)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+'''
+Solves Sudoku the way a person does, one explained step at a time.
+
+Every empty cell keeps a mask of the letters that could still go there.
+Each step uses the easiest technique that makes progress:
+
+- full house:         the last empty cell of a row, column or box
+- naked single:       a cell where only one letter fits
+- hidden single:      a letter that fits in only one cell of a row, column or box
+- naked pair:         two cells of a unit that can only hold the same two letters,
+                      so no other cell of the unit can hold them
+- hidden pair:        two letters that only fit in the same two cells of a unit,
+                      so those cells cannot hold anything else
+- pointing:           a letter that only fits in one row (or column) of a box,
+                      so it cannot go anywhere else in that row
+- box/line reduction: a letter that only fits in one box along a row (or column),
+                      so it cannot go anywhere else in that box
+
+The first three place a letter; the others only cross out candidates. Every
+step comes with a sentence a child can follow, which is what Game.tip shows,
+and the hardest technique needed to finish grades the puzzle.
+'''
+
+from collections import namedtuple
+
+from SudokuBoard import symbolsFor
+from SudokuSolver import getGeometry, getPeers
+
+# Techniques in order of difficulty
+FULL_HOUSE = 0
+NAKED_SINGLE = 1
+HIDDEN_SINGLE = 2
+NAKED_PAIR = 3
+HIDDEN_PAIR = 4
+POINTING = 5
+BOX_LINE = 6
+TECHNIQUES = ('full house', 'naked single', 'hidden single', 'naked pair',
+              'hidden pair', 'pointing', 'box/line reduction')
+
+class Step(namedtuple('Step', 'technique index value eliminations text')):
+    '''
+    One deduction.
+
+    technique is one of the constants above. Steps that place a letter have
+    the cell index and value; the others have index None and a list of
+    (cell index, mask of removed candidates) in eliminations.
+    '''
+
+    @property
+    def places(self):
+        return self.index is not None
+
+def bitValues(mask):
+    'Returns the values whose bits are set in a mask, smallest first.'
+    values = []
+    while mask:
+        low = mask & -mask
+        values.append(low.bit_length())
+        mask ^= low
+    return values
+
+class LogicSolver:
+    '''
+    Step-by-step solver over candidate masks.
+
+    Parameters:
+        cells (list): The cell values, row by row (0 for empty).
+        boxRows (int): Number of rows in a box.
+        boxCols (int): Number of columns in a box.
+        candidates (list): Optional candidate mask of every cell, e.g. a
+                           board's live candidateMasks, to skip working
+                           them out again.
+    '''
+
+    def __init__(self, cells, boxRows, boxCols, candidates=None):
+        self.boxRows = boxRows
+        self.boxCols = boxCols
+        self.size = size = boxRows * boxCols
+        self.symbols = symbolsFor(size)
+        self.rowOf, self.colOf, self.boxOf, self.units = getGeometry(boxRows, boxCols)
+        self.peers = getPeers(boxRows, boxCols)
+        self.cells = list(cells)
+        if candidates is None:
+            allValues = (1 << size) - 1
+            used = [0] * len(self.units)
+            for unitNumber, unit in enumerate(self.units):
+                for index in unit:
+                    if self.cells[index]:
+                        used[unitNumber] |= 1 << (self.cells[index] - 1)
+            # units holds row u, column u and box u at 3u, 3u + 1 and 3u + 2
+            candidates = [allValues & ~(used[3 * self.rowOf[index]] | used[3 * self.colOf[index] + 1]
+                                        | used[3 * self.boxOf[index] + 2])
+                          for index in range(size * size)]
+        self.candidates = [0 if value else mask for value, mask in zip(self.cells, candidates)]
+
+    @classmethod
+    def fromBoard(cls, board):
+        'Starts from a SudokuBoard, reusing its live candidate masks.'
+        return cls(board.cells, board.boxRows, board.boxCols, board.candidateMasks)
+
+    # Names used in the explanations ----
+
+    def cellName(self, index):
+        return '(%d,%d)' % (self.rowOf[index] + 1, self.colOf[index] + 1)
+
+    def unitName(self, unitNumber):
+        kind = ('row', 'column', 'box')[unitNumber % 3]
+        return '%s %d' % (kind, unitNumber // 3 + 1)
+
+    def letters(self, mask):
+        return ' and '.join(self.symbols[value - 1] for value in bitValues(mask))
+
+    # Applying steps ---------------------
+
+    def place(self, index, value):
+        bit = 1 << (value - 1)
+        self.cells[index] = value
+        self.candidates[index] = 0
+        candidates = self.candidates
+        for peer in self.peers[index]:
+            candidates[peer] &= ~bit
+
+    def apply(self, step):
+        if step.places:
+            self.place(step.index, step.value)
+        else:
+            for index, mask in step.eliminations:
+                self.candidates[index] &= ~mask
+
+    def _eliminate(self, cells, mask):
+        'Returns the (cell, removed) pairs for crossing mask out of the cells.'
+        return [(index, self.candidates[index] & mask) for index in cells
+                if not self.cells[index] and self.candidates[index] & mask]
+
+    # Techniques --------------------------
+
+    def _positions(self, unit, bit):
+        return [index for index in unit if self.candidates[index] & bit]
+
+    def findStep(self, limit=BOX_LINE):
+        '''
+        Finds the easiest step available, without applying it.
+
+        Parameters:
+            limit (int): The hardest technique to try.
+
+        Returns:
+            Step: The step, or None if none of the techniques up to limit
+                  makes progress (or the board has a cell where nothing fits).
+        '''
+        cells = self.cells
+        candidates = self.candidates
+        units = self.units
+        symbols = self.symbols
+
+        for index, value in enumerate(cells):
+            if not value and not candidates[index]:
+                return None # A mistake somewhere: nothing fits here
+
+        for unitNumber, unit in enumerate(units):
+            empty = [index for index in unit if not cells[index]]
+            if len(empty) == 1:
+                index = empty[0]
+                value = candidates[index].bit_length()
+                return Step(FULL_HOUSE, index, value, [],
+                            '%s is the only letter missing from %s, so it goes in %s.'
+                            % (symbols[value - 1], self.unitName(unitNumber), self.cellName(index)))
+        if limit < NAKED_SINGLE:
+            return None
+
+        for index, mask in enumerate(candidates):
+            if mask and not mask & (mask - 1):
+                value = mask.bit_length()
+                return Step(NAKED_SINGLE, index, value, [],
+                            'Only %s fits in %s: every other letter is already in its row, column or box.'
+                            % (symbols[value - 1], self.cellName(index)))
+        if limit < HIDDEN_SINGLE:
+            return None
+
+        seen = [0] * len(units)
+        for unitNumber, unit in enumerate(units):
+            once = twice = 0
+            for index in unit:
+                found = candidates[index]
+                twice |= once & found
+                once |= found
+            seen[unitNumber] = (once, twice)
+            singles = once & ~twice
+            if singles:
+                bit = singles & -singles
+                index = self._positions(unit, bit)[0]
+                value = bit.bit_length()
+                return Step(HIDDEN_SINGLE, index, value, [],
+                            'In %s, %s only fits in %s.'
+                            % (self.unitName(unitNumber), symbols[value - 1], self.cellName(index)))
+        if limit < NAKED_PAIR:
+            return None
+
+        for unitNumber, unit in enumerate(units):
+            pairs = {}
+            for index in unit:
+                mask = candidates[index]
+                if mask and bin(mask).count('1') == 2:
+                    if mask in pairs:
+                        first = pairs[mask]
+                        removed = self._eliminate([other for other in unit if other not in (first, index)], mask)
+                        if removed:
+                            return Step(NAKED_PAIR, None, None, removed,
+                                        '%s and %s can only be %s, so no other cell in %s can be %s.'
+                                        % (self.cellName(first), self.cellName(index), self.letters(mask),
+                                           self.unitName(unitNumber), self.letters(mask)))
+                    else:
+                        pairs[mask] = index
+        if limit < HIDDEN_PAIR:
+            return None
+
+        for unitNumber, unit in enumerate(units):
+            once, twice = seen[unitNumber]
+            byCells = {}
+            for value in bitValues(twice):
+                bit = 1 << (value - 1)
+                where = self._positions(unit, bit)
+                if len(where) == 2:
+                    key = tuple(where)
+                    if key in byCells:
+                        mask = byCells[key] | bit
+                        removed = self._eliminate(where, ~mask)
+                        if removed:
+                            return Step(HIDDEN_PAIR, None, None, removed,
+                                        'In %s, %s only fit in %s and %s, so those cells cannot be anything else.'
+                                        % (self.unitName(unitNumber), self.letters(mask),
+                                           self.cellName(where[0]), self.cellName(where[1])))
+                    else:
+                        byCells[key] = bit
+        if limit < POINTING:
+            return None
+
+        rowOf, colOf, boxOf = self.rowOf, self.colOf, self.boxOf
+        for box in range(self.size):
+            unitNumber = 3 * box + 2
+            for value in bitValues(seen[unitNumber][0]):
+                bit = 1 << (value - 1)
+                where = self._positions(units[unitNumber], bit)
+                for lineOf, kind, offset in ((rowOf, 'row', 0), (colOf, 'column', 1)):
+                    lines = set(lineOf[index] for index in where)
+                    if len(lines) == 1:
+                        line = lines.pop()
+                        removed = self._eliminate([index for index in units[3 * line + offset]
+                                                   if boxOf[index] != box], bit)
+                        if removed:
+                            return Step(POINTING, None, None, removed,
+                                        'In box %d, %s only fits in %s %d, so %s cannot go anywhere else in %s %d.'
+                                        % (box + 1, symbols[value - 1], kind, line + 1,
+                                           symbols[value - 1], kind, line + 1))
+        if limit < BOX_LINE:
+            return None
+
+        for unitNumber, unit in enumerate(units):
+            if unitNumber % 3 == 2:
+                continue
+            for value in bitValues(seen[unitNumber][0]):
+                bit = 1 << (value - 1)
+                boxes = set(boxOf[index] for index in self._positions(unit, bit))
+                if len(boxes) == 1:
+                    box = boxes.pop()
+                    removed = self._eliminate([index for index in units[3 * box + 2] if index not in unit], bit)
+                    if removed:
+                        return Step(BOX_LINE, None, None, removed,
+                                    'In %s, %s only fits in box %d, so %s cannot go anywhere else in box %d.'
+                                    % (self.unitName(unitNumber), symbols[value - 1], box + 1,
+                                       symbols[value - 1], box + 1))
+        return None
+
+    def nextStep(self, limit=BOX_LINE):
+        'Finds the easiest step available and applies it (None if stuck).'
+        step = self.findStep(limit)
+        if step is not None:
+            self.apply(step)
+        return step
+
+    def nextPlacement(self, limit=BOX_LINE):
+        '''
+        Applies steps until one places a letter.
+
+        Returns:
+            list: The steps taken, ending with the placement; empty if the
+                  techniques up to limit get stuck first.
+        '''
+        steps = []
+        while True:
+            step = self.nextStep(limit)
+            if step is None:
+                return []
+            steps.append(step)
+            if step.places:
+                return steps
+
+    def solve(self, limit=BOX_LINE):
+        '''
+        Applies steps until the board is full or no technique helps.
+
+        Returns:
+            list: Every step taken, in order.
+        '''
+        steps = []
+        while not all(self.cells):
+            step = self.nextStep(limit)
+            if step is None:
+                break
+            steps.append(step)
+        return steps
+
+    def isSolved(self):
+        return all(self.cells)
+
+def rate(cells, boxRows, boxCols, limit=BOX_LINE):
+    '''
+    Grades a puzzle by the hardest technique needed to solve it.
+
+    Returns:
+        int: The technique (FULL_HOUSE to BOX_LINE), or None if the
+             techniques up to limit cannot finish the puzzle.
+    '''
+    solver = LogicSolver(cells, boxRows, boxCols)
+    steps = solver.solve(limit)
+    if not solver.isSolved():
+        return None
+    return max([step.technique for step in steps] or [FULL_HOUSE])
@@ -0,0 +1,212 @@
+'''
+Optional counters and histograms for the engine's hot paths.
+
+Instrumentation is off until a sink is installed with metrics.setSink().
+Every instrumented spot first checks "metrics.sink is not None", so with
+no sink nothing is timed, allocated or written (the solver keeps its counts
+in a few local integers either way and only reports them to a sink).
+
+What is recorded (names as written to the sink):
+
+    solver_nodes, solver_backtracks, solver_max_depth
+                        histograms, one observation per MRV solve
+    generator_attempts  histogram, fresh solutions tried per generated puzzle
+    generator_seconds   histogram, time to generate a puzzle
+    generator_missed_total
+                        counter, puzzles that missed their target difficulty
+    puzzles_total       counter, new games by source (bank or generated)
+    pool_requests_total counter, puzzles asked of a PuzzlePool, by whether
+                        one was ready
+    command_seconds     histogram, time to handle a player command
+
+Sinks:
+
+    MemorySink       keeps totals in memory (snapshot() returns them)
+    JsonLinesSink    appends every event to a file as a line of JSON
+    PrometheusSink   a MemorySink that can also dump the totals in the
+                     Prometheus text format
+'''
+
+import atexit
+import json
+import os
+import threading
+import time
+
+# Upper bounds of the histogram buckets: decades, which suit both times in
+# seconds and counts of solver nodes
+BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+def percentile(samples, fraction):
+    'Returns the sample at the given fraction (0 to 1) of the sorted samples.'
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def labelKey(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+class Histogram:
+    'Counts of observations per bucket, plus their sum and count.'
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # The last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for number, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            number = len(self.buckets)
+        self.counts[number] += 1
+        self.sum += value
+        self.count += 1
+
+class MemorySink:
+    'Keeps running totals of every counter and histogram.'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}   # (name, labels) -> total
+        self.histograms = {} # (name, labels) -> Histogram
+
+    def count(self, name, amount, labels):
+        key = (name, labelKey(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels):
+        key = (name, labelKey(labels))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def snapshot(self):
+        '''
+        Returns the totals so far.
+
+        Returns:
+            dict: 'counters' maps (name, labels) to a total, and 'histograms'
+                  maps (name, labels) to {'count', 'sum', 'buckets'}, where
+                  buckets lists (upper bound, count) pairs.
+        '''
+        with self.lock:
+            return {'counters': dict(self.counters),
+                    'histograms': {key: {'count': histogram.count, 'sum': histogram.sum,
+                                         'buckets': list(zip(histogram.buckets + (float('inf'),),
+                                                             histogram.counts))}
+                                   for key, histogram in self.histograms.items()}}
+
+class JsonLinesSink:
+    '''
+    Appends every event to a file, one JSON object per line, e.g.
+    {"time": 1704240000.1, "type": "histogram", "name": "solver_nodes",
+     "value": 12, "labels": {"size": 9}}
+    '''
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.file = open(path, 'a')
+
+    def write(self, kind, name, value, labels):
+        line = json.dumps({'time': time.time(), 'type': kind, 'name': name,
+                           'value': value, 'labels': labels or {}})
+        with self.lock:
+            self.file.write(line + '\n')
+
+    def count(self, name, amount, labels):
+        self.write('counter', name, amount, labels)
+
+    def observe(self, name, value, labels):
+        self.write('histogram', name, value, labels)
+
+    def close(self):
+        self.file.close()
+
+def formatLabels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('"', '\\"')) for name, value in pairs)
+
+class PrometheusSink(MemorySink):
+    'A MemorySink that can write its totals in the Prometheus text format.'
+
+    def text(self):
+        'Returns the totals in the Prometheus text exposition format.'
+        snapshot = self.snapshot()
+        lines = []
+        for name in sorted(set(name for name, labels in snapshot['counters'])):
+            lines.append('# TYPE kidsudoku_%s counter' % name)
+            for (counterName, labels), total in sorted(snapshot['counters'].items()):
+                if counterName == name:
+                    lines.append('kidsudoku_%s%s %s' % (name, formatLabels(labels), total))
+        for name in sorted(set(name for name, labels in snapshot['histograms'])):
+            lines.append('# TYPE kidsudoku_%s histogram' % name)
+            for (histogramName, labels), histogram in sorted(snapshot['histograms'].items()):
+                if histogramName != name:
+                    continue
+                running = 0
+                for bound, count in histogram['buckets']:
+                    running += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('kidsudoku_%s_bucket%s %d' % (name, formatLabels(labels, [('le', le)]), running))
+                lines.append('kidsudoku_%s_sum%s %s' % (name, formatLabels(labels), histogram['sum']))
+                lines.append('kidsudoku_%s_count%s %d' % (name, formatLabels(labels), histogram['count']))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        'Writes the totals to a file, replacing it in one step.'
+        with open(path + '.tmp', 'w') as file:
+            file.write(self.text())
+        os.replace(path + '.tmp', path)
+
+class Metrics:
+    '''
+    The switchboard between the instrumented code and the sink. Callers
+    check "metrics.sink is not None" before measuring anything, so nothing
+    is spent while no sink is installed.
+    '''
+
+    def __init__(self):
+        self.sink = None
+
+    def setSink(self, sink):
+        'Installs a sink (None turns instrumentation off).'
+        self.sink = sink
+
+    def count(self, name, amount=1, labels=None):
+        sink = self.sink
+        if sink is not None:
+            sink.count(name, amount, labels)
+
+    def observe(self, name, value, labels=None):
+        sink = self.sink
+        if sink is not None:
+            sink.observe(name, value, labels)
+
+metrics = Metrics()
+
+def install(path):
+    '''
+    Turns instrumentation on, writing to a metrics file named on a command
+    line or in the KIDSUDOKU_METRICS environment variable: Prometheus text
+    if it ends in .prom (written at exit, and whenever the caller dumps
+    it), JSON lines otherwise.
+
+    Returns:
+        The installed sink.
+    '''
+    if path.endswith('.prom'):
+        sink = PrometheusSink()
+        atexit.register(sink.dump, path)
+    else:
+        sink = JsonLinesSink(path)
+        atexit.register(sink.close)
+    metrics.setSink(sink)
+    return sink
@@ -0,0 +1,234 @@
+'''
+Append-only record of every change made to a board during a game.
+
+Each event is one 32-bit number holding the cell, the value it had before
+and the value it has after, plus what kind of event it was:
+
+    bits 12-21   cell index (row * size + col)
+    bits 10-11   kind: MOVE, UNDO or REDO
+    bits 5-9     value before (0 for empty)
+    bits 0-4     value after (0 for empty)
+
+Undoing a move does not remove it: it appends an UNDO event that changes
+the cell back, and a redo appends a REDO event that changes it again. So
+the board after any number of events is the starting board with the
+"after" value of each event written in turn, whatever the kinds were, and
+replay() rebuilds finished games without knowing anything about undo.
+
+Which moves can be undone or redone is kept on two stacks of event
+positions, so undo and redo take constant time and copy nothing. Every
+SNAPSHOT_INTERVAL events the log also keeps a copy of the cells, so
+cellsAt() jumps to any point of a long game by replaying a few events from
+the nearest snapshot, and a stored game can be resumed from its latest
+snapshot instead of from the first move.
+
+toBytes() gives the events as little-endian 32-bit numbers, 4 bytes per
+change, and fromBytes() reads them back.
+'''
+
+import sys
+from array import array
+
+MOVE = 0
+UNDO = 1
+REDO = 2
+
+SNAPSHOT_INTERVAL = 64
+
+_CELL_SHIFT = 12
+_KIND_SHIFT = 10
+_BEFORE_SHIFT = 5
+_VALUE_MASK = 0x1f
+
+def encode(kind, index, before, after):
+    'Returns the event number for a change of cell index from before to after.'
+    return index << _CELL_SHIFT | kind << _KIND_SHIFT | before << _BEFORE_SHIFT | after
+
+def decode(event):
+    '''
+    Splits an event number into its parts.
+
+    Returns:
+        tuple: (kind, index, before, after)
+    '''
+    return (event >> _KIND_SHIFT & 3, event >> _CELL_SHIFT,
+            event >> _BEFORE_SHIFT & _VALUE_MASK, event & _VALUE_MASK)
+
+def _events(data):
+    'Returns the event array stored in bytes from toBytes().'
+    events = array('I')
+    events.frombytes(data)
+    if sys.byteorder == 'big':
+        events.byteswap()
+    return events
+
+def replay(cells, data):
+    '''
+    Returns the board at the end of a stored game, without building a log.
+
+    Parameters:
+        cells (list): The starting cells of the puzzle.
+        data (bytes): The events, as returned by MoveLog.toBytes().
+
+    Returns:
+        list: The final cell values.
+    '''
+    board = list(cells)
+    for event in _events(data):
+        board[event >> _CELL_SHIFT] = event & _VALUE_MASK
+    return board
+
+class MoveLog:
+    '''
+    The changes made to one board, with undo and redo.
+
+    The log does not touch the board: record() is told about each move, and
+    undo() and redo() say which cell to change back or again.
+    '''
+
+    def __init__(self, cells):
+        '''
+        Parameters:
+            cells (list): The cells at the start of the game.
+        '''
+        self.start = bytes(cells)
+        self.cells = bytearray(cells)   # The cells after the last event
+        self.events = array('I')
+        self.done = []                  # Positions of the moves undo() takes back, last on top
+        self.undone = []                # Positions of the moves redo() makes again, last on top
+        self.snapshots = [(0, self.start)] # (events before it, cells), oldest first
+
+    def __len__(self):
+        return len(self.events)
+
+    def _append(self, kind, index, before, after):
+        self.events.append(encode(kind, index, before, after))
+        self.cells[index] = after
+        if len(self.events) % SNAPSHOT_INTERVAL == 0:
+            self.snapshots.append((len(self.events), bytes(self.cells)))
+
+    def record(self, index, before, after):
+        '''
+        Adds a move made by the player. Any moves that were undone can no
+        longer be redone.
+
+        Parameters:
+            index (int): The cell (row * size + col).
+            before (int): Its value before the move (0 for empty).
+            after (int): Its value after the move.
+        '''
+        self.done.append(len(self.events))
+        self.undone.clear()
+        self._append(MOVE, index, before, after)
+
+    def canUndo(self):
+        return bool(self.done)
+
+    def canRedo(self):
+        return bool(self.undone)
+
+    def undo(self):
+        '''
+        Takes back the last move that is still in place.
+
+        Returns:
+            tuple: (index, value) the cell must be set back to (0 to empty
+                   it), or None if there is nothing to undo.
+        '''
+        if not self.done:
+            return None
+        position = self.done.pop()
+        kind, index, before, after = decode(self.events[position])
+        self.undone.append(position)
+        self._append(UNDO, index, after, before)
+        return index, before
+
+    def redo(self):
+        '''
+        Makes the last undone move again.
+
+        Returns:
+            tuple: (index, value) to put in the cell, or None if there is
+                   nothing to redo.
+        '''
+        if not self.undone:
+            return None
+        position = self.undone.pop()
+        kind, index, before, after = decode(self.events[position])
+        self.done.append(position)
+        self._append(REDO, index, before, after)
+        return index, after
+
+    def cellsAt(self, position):
+        '''
+        Returns the cells as they were after the first position events,
+        replaying from the nearest snapshot.
+        '''
+        if not 0 <= position <= len(self.events):
+            raise IndexError('position out of range')
+        first, cells = next(snapshot for snapshot in reversed(self.snapshots) if snapshot[0] <= position)
+        cells = list(cells)
+        events = self.events
+        for number in range(first, position):
+            event = events[number]
+            cells[event >> _CELL_SHIFT] = event & _VALUE_MASK
+        return cells
+
+    def snapshot(self):
+        '''
+        Returns the latest snapshot, for storing next to the events so a
+        game can be resumed without replaying all of them.
+
+        Returns:
+            tuple: (events before it, cells as bytes)
+        '''
+        return self.snapshots[-1]
+
+    def toBytes(self):
+        'Returns the events as little-endian 32-bit numbers.'
+        if sys.byteorder == 'big':
+            events = array('I', self.events)
+            events.byteswap()
+            return events.tobytes()
+        return self.events.tobytes()
+
+    @classmethod
+    def fromBytes(cls, cells, data, snapshot=None):
+        '''
+        Rebuilds a log, undo and redo included, from stored events.
+
+        Parameters:
+            cells (list): The cells at the start of the game.
+            data (bytes): The events, as returned by toBytes().
+            snapshot (tuple): A snapshot() of the same game, to skip
+                              rewriting the cells before it.
+
+        Returns:
+            MoveLog: The log as it was when it was stored.
+        '''
+        log = cls(cells)
+        events = log.events = _events(data)
+        done, undone = log.done, log.undone
+        for position, event in enumerate(events):
+            kind = event >> _KIND_SHIFT & 3
+            if kind == MOVE:
+                done.append(position)
+                undone.clear()
+            elif kind == UNDO:
+                undone.append(done.pop())
+            else:
+                done.append(undone.pop())
+        first = 0
+        if snapshot is not None and snapshot[0] <= len(events):
+            first = snapshot[0]
+            log.cells = bytearray(snapshot[1])
+            if first:
+                log.snapshots.append(snapshot)
+        state = log.cells
+        snapshots = log.snapshots
+        for position in range(first, len(events)):
+            event = events[position]
+            state[event >> _CELL_SHIFT] = event & _VALUE_MASK
+            if (position + 1) % SNAPSHOT_INTERVAL == 0:
+                snapshots.append((position + 1, bytes(state)))
+        return log
@@ -0,0 +1,161 @@
+'''
+Compact binary puzzle banks with instant random access.
+
+A bank file holds many pre-generated puzzles of one board size, so the game
+can start a new puzzle by reading a few bytes instead of generating one.
+
+File layout (all numbers little-endian):
+
+    header   magic "KSPB", version, box rows, box columns, bits per cell,
+             record size and puzzle count (see HEADER)
+    records  one fixed-size record per puzzle
+
+Each record is:
+
+    1 byte          difficulty (position in PuzzleGenerator.DIFFICULTIES)
+    area / 8 bytes  givens: bit i is set if cell i is given at the start
+    packed cells    the solution, bitsPerCell bits per cell (value - 1), so
+                    2 bits per cell on 4x4 boards and 4 bits up to 16x16
+
+The givens are the solution cells whose bit is set. Because every record is
+the same size, puzzle k starts at HEADER.size + k * recordSize, which is the
+offset index: it costs no space and no lookups. The reader memory-maps the
+file, so opening a bank of millions of puzzles reads only the header.
+'''
+
+import mmap
+import os
+import struct
+
+from PuzzleGenerator import DIFFICULTIES, Puzzle
+from SudokuBoard import BOX_SHAPES
+
+MAGIC = b'KSPB'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBIQ') # magic, version, boxRows, boxCols, bitsPerCell, recordSize, count
+
+def _layout(boxRows, boxCols):
+    'Returns (bitsPerCell, givensBytes, solutionBytes) for a board shape.'
+    size = boxRows * boxCols
+    area = size * size
+    bitsPerCell = max(1, (size - 1).bit_length())
+    return bitsPerCell, (area + 7) // 8, (area * bitsPerCell + 7) // 8
+
+def bankPath(directory, size, difficulty):
+    'Returns the usual file name of the bank for a board size and difficulty.'
+    return os.path.join(directory, '%dx%d-%s.kspb' % (size, size, difficulty))
+
+class PuzzleBankWriter:
+    '''
+    Writes puzzles of one board size to a new bank file.
+
+    Use it as a context manager, or call close() when done so the puzzle
+    count in the header is filled in.
+    '''
+
+    def __init__(self, path, size):
+        self.boxRows, self.boxCols = BOX_SHAPES[size]
+        self.area = size * size
+        self.bitsPerCell, self.givensBytes, self.solutionBytes = _layout(self.boxRows, self.boxCols)
+        self.recordSize = 1 + self.givensBytes + self.solutionBytes
+        self.count = 0
+        self.file = open(path, 'wb')
+        self.file.write(self._header())
+
+    def _header(self):
+        return HEADER.pack(MAGIC, VERSION, self.boxRows, self.boxCols,
+                           self.bitsPerCell, self.recordSize, self.count)
+
+    def write(self, puzzle):
+        '''
+        Appends a puzzle to the bank.
+
+        Parameters:
+            puzzle (Puzzle): A puzzle of the bank's board size.
+        '''
+        if (puzzle.boxRows, puzzle.boxCols) != (self.boxRows, self.boxCols):
+            raise ValueError('Puzzle does not match the board size of the bank')
+        givens = 0
+        solution = 0
+        for index in range(self.area):
+            if puzzle.cells[index]:
+                givens |= 1 << index
+            solution |= (puzzle.solution[index] - 1) << (index * self.bitsPerCell)
+        self.file.write(bytes((DIFFICULTIES.index(puzzle.difficulty),))
+                        + givens.to_bytes(self.givensBytes, 'little')
+                        + solution.to_bytes(self.solutionBytes, 'little'))
+        self.count += 1
+
+    def close(self):
+        'Fills in the puzzle count and closes the file.'
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        self.file.write(self._header())
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class PuzzleBank:
+    '''
+    Read-only view of a bank file. bank[k] returns puzzle k in O(1) without
+    reading the rest of the file.
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise ValueError('%s is not a puzzle bank' % path)
+        magic, version, self.boxRows, self.boxCols, self.bitsPerCell, self.recordSize, self.count = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a version %d puzzle bank' % (path, VERSION))
+        self.size = self.boxRows * self.boxCols
+        self.area = self.size * self.size
+        _, self.givensBytes, self.solutionBytes = _layout(self.boxRows, self.boxCols)
+        if len(self.map) < HEADER.size + self.count * self.recordSize:
+            raise ValueError('%s is truncated' % path)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, number):
+        '''
+        Returns puzzle number k of the bank.
+
+        Returns:
+            Puzzle: The puzzle; its seed is its number in the bank.
+        '''
+        if number < 0:
+            number += self.count
+        if not 0 <= number < self.count:
+            raise IndexError('puzzle number out of range')
+        start = HEADER.size + number * self.recordSize
+        record = self.map[start:start + self.recordSize]
+        givens = int.from_bytes(record[1:1 + self.givensBytes], 'little')
+        packed = int.from_bytes(record[1 + self.givensBytes:], 'little')
+        cellMask = (1 << self.bitsPerCell) - 1
+        solution = []
+        for index in range(self.area):
+            solution.append((packed & cellMask) + 1)
+            packed >>= self.bitsPerCell
+        cells = [value if givens >> index & 1 else 0 for index, value in enumerate(solution)]
+        return Puzzle(cells, solution, self.boxRows, self.boxCols, DIFFICULTIES[record[0]], number)
+
+    def randomPuzzle(self, rng):
+        'Returns a random puzzle from the bank.'
+        return self[rng.randrange(self.count)]
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
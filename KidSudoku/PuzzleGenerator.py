@@ -0,0 +1,193 @@
+'''
+Seeded puzzle generator for Sudoku Adventure: Kids Edition.
+
+A puzzle is made by picking a random complete board and then taking letters
+away one cell at a time, in random order, putting a letter back whenever
+the puzzle could no longer be solved with the techniques allowed for its
+difficulty. Solving it step by step without guessing proves that it has
+exactly one answer, so no solution counting is needed, and the whole thing
+is a single pass over the cells, so generation time is bounded. The same
+seed, size and difficulty always give the same puzzle.
+
+Difficulty is measured by the solving techniques a puzzle needs:
+
+- Easy: there is always a row, column or box with just one empty cell, so
+  the missing letter can be read straight off.
+- Hard: the player has to work out which letters fit a cell (naked single)
+  or where a letter can go in a row, column or box (hidden single). Hard
+  puzzles never need guessing.
+'''
+
+import random
+import time
+from collections import namedtuple
+
+from LogicSolver import FULL_HOUSE, HIDDEN_SINGLE, NAKED_SINGLE, rate
+from Metrics import metrics
+from SudokuBoard import BOX_SHAPES, SudokuBoard
+from SudokuSolver import getGeometry, solveCells
+
+DIFFICULTIES = ('Easy', 'Hard')
+
+# How many fresh solutions to try before settling for a puzzle that missed
+# its target difficulty
+MAX_ATTEMPTS = 20
+
+class Puzzle(namedtuple('Puzzle', 'cells solution boxRows boxCols difficulty seed')):
+    '''
+    A generated puzzle. cells holds the givens (0 for empty) and solution the
+    completed board, both as flat lists of values row by row.
+    '''
+    __slots__ = ()
+
+    def board(self):
+        'Returns the givens as a SudokuBoard.'
+        board = SudokuBoard(self.boxRows, self.boxCols)
+        for index, value in enumerate(self.cells):
+            if value:
+                board.place(index // board.size, index % board.size, value, given=True)
+        return board
+
+def solvableWithSingles(cells, boxRows, boxCols, limit=HIDDEN_SINGLE):
+    '''
+    Checks whether singles finish the board, like rate(cells, boxRows,
+    boxCols, limit) is not None but with none of LogicSolver's step records
+    or explanations, since the generator asks this for every cell it takes
+    away. Singles never block each other, so the order they are found in
+    does not change the answer.
+
+    Parameters:
+        cells (list): The cell values, row by row (0 for empty).
+        boxRows (int): Number of rows in a box.
+        boxCols (int): Number of columns in a box.
+        limit (int): The hardest technique allowed: FULL_HOUSE, NAKED_SINGLE
+                     or HIDDEN_SINGLE (LogicSolver's constants).
+
+    Returns:
+        bool: True if the techniques up to limit fill in every cell.
+    '''
+    if limit > HIDDEN_SINGLE:
+        raise ValueError('Only singles are checked here; use LogicSolver.rate')
+    size = boxRows * boxCols
+    allValues = (1 << size) - 1
+    rowOf, colOf, boxOf, units = getGeometry(boxRows, boxCols)
+    cells = list(cells)
+    rows = [0] * size
+    cols = [0] * size
+    boxes = [0] * size
+    for index, value in enumerate(cells):
+        if value:
+            bit = 1 << (value - 1)
+            rows[rowOf[index]] |= bit
+            cols[colOf[index]] |= bit
+            boxes[boxOf[index]] |= bit
+
+    def assign(index, bit):
+        cells[index] = bit.bit_length()
+        rows[rowOf[index]] |= bit
+        cols[colOf[index]] |= bit
+        boxes[boxOf[index]] |= bit
+
+    def options(index):
+        return allValues & ~(rows[rowOf[index]] | cols[colOf[index]] | boxes[boxOf[index]])
+
+    while not all(cells):
+        progress = False
+        for unit in units:
+            empty = [index for index in unit if not cells[index]]
+            if len(empty) == 1 and options(empty[0]):
+                assign(empty[0], options(empty[0]))
+                progress = True
+        if progress:
+            continue
+
+        if limit >= NAKED_SINGLE:
+            for index in range(size * size):
+                if not cells[index]:
+                    found = options(index)
+                    if found and not found & (found - 1):
+                        assign(index, found)
+                        progress = True
+            if progress:
+                continue
+
+        if limit >= HIDDEN_SINGLE:
+            for unit in units:
+                once = 0
+                twice = 0
+                for index in unit:
+                    if not cells[index]:
+                        found = options(index)
+                        twice |= once & found
+                        once |= found
+                singles = once & ~twice
+                if singles:
+                    bit = singles & -singles
+                    for index in unit:
+                        if not cells[index] and options(index) & bit:
+                            assign(index, bit)
+                            break
+                    progress = True
+                    break # Go back to the easier techniques
+            if progress:
+                continue
+        return False
+    return True
+
+def gradePuzzle(cells, boxRows, boxCols):
+    '''
+    Grades a puzzle by the techniques needed to solve it.
+
+    Returns:
+        str: 'Easy' if filling in the last empty cell of a row, column or box
+             is always enough, otherwise 'Hard'.
+    '''
+    if rate(cells, boxRows, boxCols, FULL_HOUSE) == FULL_HOUSE:
+        return 'Easy'
+    return 'Hard'
+
+def randomSolution(boxRows, boxCols, rng):
+    'Returns a random complete board as a flat list of values.'
+    return solveCells([0] * (boxRows * boxCols) ** 2, boxRows, boxCols, rng)
+
+def generatePuzzle(seed, size=4, difficulty='Easy'):
+    '''
+    Generates a puzzle with exactly one solution.
+
+    Parameters:
+        seed (int): The random seed; the same seed always gives the same puzzle.
+        size (int): The board size (4, 9, 16, ...).
+        difficulty (str): The target difficulty, 'Easy' or 'Hard'.
+
+    Returns:
+        Puzzle: The puzzle. Its difficulty is the measured one, which only
+                differs from the target if MAX_ATTEMPTS solutions in a row
+                could not produce the target (e.g. 'Hard' on tiny boards).
+    '''
+    if difficulty not in DIFFICULTIES:
+        raise ValueError('Unknown difficulty: %s' % difficulty)
+    boxRows, boxCols = BOX_SHAPES[size]
+    rng = random.Random(seed)
+    limit = FULL_HOUSE if difficulty == 'Easy' else HIDDEN_SINGLE
+    started = time.perf_counter() if metrics.sink is not None else 0
+
+    for attempt in range(MAX_ATTEMPTS):
+        solution = randomSolution(boxRows, boxCols, rng)
+        cells = list(solution)
+        order = list(range(size * size))
+        rng.shuffle(order)
+        for index in order:
+            value = cells[index]
+            cells[index] = 0
+            if not solvableWithSingles(cells, boxRows, boxCols, limit):
+                cells[index] = value
+        grade = gradePuzzle(cells, boxRows, boxCols)
+        if grade == difficulty:
+            break
+    if metrics.sink is not None:
+        labels = {'size': size, 'difficulty': difficulty}
+        metrics.observe('generator_attempts', attempt + 1, labels)
+        metrics.observe('generator_seconds', time.perf_counter() - started, labels)
+        if grade != difficulty:
+            metrics.count('generator_missed_total', 1, labels)
+    return Puzzle(cells, solution, boxRows, boxCols, grade, seed)
@@ -0,0 +1,149 @@
+'''
+Puzzles made ahead of time, so a new game starts at once.
+
+A PuzzlePool keeps a few ready puzzles for every board size and difficulty
+that has been asked for. Whenever a pool runs low (below lowWater puzzles)
+a background thread tops it up to target, one puzzle at a time, while the
+player is busy with the current game. Generating a 16x16 puzzle can take
+seconds, but "play again" only has to take one off the pool.
+
+The pool also remembers the keys of the last recent puzzles it served and
+does not hand them out again, so a player is not given a puzzle they have
+just played. Small boards (up to 6x6) use canonical keys (see Canonical), so
+a puzzle that only has its letters renamed or its rows swapped counts as
+the same puzzle. Bigger boards use their cells, since repeats there are
+rare and canonical keys too slow. The check is made both when a puzzle is
+added to the pool and when it is served, since a pooled puzzle can have
+been served from elsewhere in the meantime. When a board size has so few
+puzzles that MAX_SKIPS fresh ones in a row were all recent, the next one is
+used anyway.
+
+If making a puzzle fails in the background, the error is printed and that
+pool is not refilled until the next get() or warm() for it. A get() from an
+empty pool makes its puzzle in the caller's thread, so an error that keeps
+happening is raised there.
+'''
+
+import collections
+import threading
+import traceback
+
+from Canonical import canonicalKey
+from Metrics import metrics
+
+TARGET = 3      # Puzzles a pool is filled up to
+LOW_WATER = 2   # Refill once a pool holds fewer than this
+RECENT = 500    # Served puzzles remembered, and not served again
+MAX_SKIPS = 20  # Recent puzzles skipped in a row before one is taken anyway
+
+def puzzleKey(puzzle):
+    'Returns the key used to spot repeated puzzles.'
+    if puzzle.boxRows * puzzle.boxCols <= 6:
+        return canonicalKey(puzzle.cells, puzzle.boxRows, puzzle.boxCols)
+    return bytes(puzzle.cells)
+
+class PuzzlePool:
+    '''
+    Ready puzzles by (size, difficulty), refilled by a background thread.
+
+    Parameters:
+        source: Function (size, difficulty) -> Puzzle that makes a puzzle.
+        target (int): Puzzles each pool is filled up to.
+        lowWater (int): A pool is refilled once it holds fewer than this.
+        recent (int): How many served puzzles are not served again.
+    '''
+
+    def __init__(self, source, target=TARGET, lowWater=LOW_WATER, recent=RECENT):
+        self.source = source
+        self.target = target
+        self.lowWater = lowWater
+        self.recentLimit = recent
+        self.condition = threading.Condition()
+        self.pools = {}                           # (size, difficulty) -> deque of (key, Puzzle)
+        self.refilling = set()                    # Pools being topped up to target
+        self.skips = collections.Counter()        # Recent puzzles made in a row, per pool
+        self.recent = collections.OrderedDict()   # Keys of served puzzles, oldest first
+        self.worker = None
+        self.closed = False
+
+    def warm(self, size, difficulty):
+        'Starts filling the pool of a board size and difficulty in the background.'
+        with self.condition:
+            self._refill((size, difficulty))
+
+    def get(self, size, difficulty):
+        '''
+        Returns a puzzle, from the pool if one is ready (otherwise it is made
+        now), and has the pool topped up in the background.
+        '''
+        pool = (size, difficulty)
+        entry = None
+        with self.condition:
+            ready = self.pools.get(pool)
+            while ready and entry is None:
+                entry = ready.popleft()
+                if entry[0] in self.recent: # Served since it was made
+                    entry = None
+            self._refill(pool)
+        metrics.count('pool_requests_total', 1, {'ready': 'yes' if entry else 'no', 'size': size})
+        skips = 0
+        while entry is None:
+            puzzle = self.source(size, difficulty)
+            key = puzzleKey(puzzle)
+            with self.condition:
+                fresh = key not in self.recent
+            if fresh or skips >= MAX_SKIPS:
+                entry = (key, puzzle)
+            skips += 1
+        with self.condition:
+            self.recent[entry[0]] = None
+            self.recent.move_to_end(entry[0])
+            while len(self.recent) > self.recentLimit:
+                self.recent.popitem(last=False)
+        return entry[1]
+
+    def close(self):
+        'Stops the background thread (after the puzzle it is making, if any).'
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.worker is not None:
+            self.worker.join()
+
+    def _refill(self, pool):
+        # Called with the condition held
+        ready = self.pools.setdefault(pool, collections.deque())
+        if len(ready) < self.lowWater and pool not in self.refilling:
+            self.refilling.add(pool)
+            self.condition.notify()
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._run, name='PuzzlePool', daemon=True)
+            self.worker.start()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.refilling and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                pool = min(self.refilling) # Smallest boards first: they are quickest to make
+            try:
+                puzzle = self.source(*pool)
+                key = puzzleKey(puzzle)
+            except Exception:
+                traceback.print_exc()
+                metrics.count('pool_errors_total', 1, {'size': pool[0]})
+                with self.condition:
+                    self.refilling.discard(pool)
+                continue
+            with self.condition:
+                ready = self.pools[pool]
+                if (key in self.recent or any(key == other for other, _ in ready)) \
+                        and self.skips[pool] < MAX_SKIPS:
+                    self.skips[pool] += 1
+                    continue
+                self.skips[pool] = 0
+                ready.append((key, puzzle))
+                if len(ready) >= self.target:
+                    self.refilling.discard(pool)
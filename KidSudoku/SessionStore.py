@@ -0,0 +1,190 @@
+'''
+Saved games, kept in an SQLite file so players can carry on after the
+program stops, crashes or restarts.
+
+There is one row per player, looked up by player id (the primary key). A
+row holds the puzzle, the difficulty being played and the game's MoveLog:
+its events and its latest snapshot, so resuming rebuilds the board without
+going back through the moves.
+
+Saving does not write anything straight away. save() only notes that a
+player's game changed, and flush() writes every game noted since the last
+flush in a single transaction, so a server with thousands of players makes
+one commit (and at most one fsync) per flush instead of one per move, and a
+game changed ten times between flushes is written once. Callers flush
+every FLUSH_INTERVAL seconds or so, and on the way out; a crash loses at
+most the moves since the last flush. A flush that fails (say the database
+is locked) puts its changes back, so the next flush writes them.
+
+The database runs in WAL mode with synchronous=NORMAL: a commit only
+appends to the write-ahead log, which survives the process crashing (a
+power cut may lose the last few commits, never corrupt the file), and
+readers never wait for the writer.
+
+Usage:
+    store = SessionStore('sessions.db')
+    store.save('sam', game)         # After each move
+    store.flush()                   # Now and then
+    game = store.load('sam')        # Next time (None if there is no game)
+'''
+
+import sqlite3
+import threading
+import time
+
+from PuzzleGenerator import Puzzle
+from SudokuGame import Game
+
+FLUSH_INTERVAL = 1.0 # Seconds between flushes, for callers that flush on a timer
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sessions (
+    player TEXT PRIMARY KEY,
+    boxRows INTEGER NOT NULL,
+    boxCols INTEGER NOT NULL,
+    difficulty TEXT NOT NULL,         -- Difficulty being played
+    grade TEXT NOT NULL,              -- Difficulty the puzzle was made for
+    seed INTEGER,
+    cells BLOB NOT NULL,              -- Givens, one byte per cell
+    solution BLOB NOT NULL,
+    moves BLOB NOT NULL,              -- MoveLog.toBytes()
+    snapshotPosition INTEGER NOT NULL,
+    snapshotCells BLOB NOT NULL,
+    updated REAL NOT NULL
+) WITHOUT ROWID
+'''
+
+class SessionStore:
+    '''
+    Saved games by player id, with batched writes.
+
+    The store can be shared between threads: a server can note changes in
+    its event loop and flush from a worker thread. Noting a change never
+    waits for a flush, which holds a lock of its own on the database.
+    '''
+
+    def __init__(self, path):
+        '''
+        Parameters:
+            path (str): The database file (created if it does not exist).
+        '''
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(SCHEMA)
+        self.lock = threading.Lock()   # Guards pending, writing and batches, never held while writing
+        self.connectionLock = threading.Lock()
+        self.pending = {}              # player -> Game to write, or None to delete
+        self.writing = {}              # player -> (batch, Game or None), for batches being written
+        self.batches = 0               # Batches taken so far
+
+    def save(self, player, game):
+        'Notes that a game changed; the next flush writes it.'
+        with self.lock:
+            self.pending[player] = game
+
+    def delete(self, player):
+        'Notes that a game is over; the next flush removes it.'
+        with self.lock:
+            self.pending[player] = None
+
+    def load(self, player):
+        '''
+        Returns a player's saved game, including changes not flushed yet.
+
+        Returns:
+            Game: The game, or None if the player has no saved game.
+        '''
+        with self.lock:
+            if player in self.pending:
+                return self.pending[player]
+            if player in self.writing:
+                return self.writing[player][1]
+        # A batch leaves writing only once it is committed, so the row is current
+        with self.connectionLock:
+            row = self.connection.execute(
+                'SELECT boxRows, boxCols, difficulty, grade, seed, cells, solution, moves, '
+                'snapshotPosition, snapshotCells FROM sessions WHERE player = ?', (player,)).fetchone()
+        if row is None:
+            return None
+        boxRows, boxCols, difficulty, grade, seed, cells, solution, moves, position, snapshot = row
+        puzzle = Puzzle(list(cells), list(solution), boxRows, boxCols, grade, seed)
+        return Game.resume(puzzle, difficulty, moves, (position, snapshot))
+
+    def players(self):
+        'Returns the ids of the players with a saved game.'
+        self.flush()
+        with self.connectionLock:
+            return [player for player, in self.connection.execute('SELECT player FROM sessions ORDER BY player')]
+
+    def takePending(self):
+        '''
+        Takes the changes noted since the last flush, ready for write().
+        Call it where the games are played (the event loop of a server), so
+        no game changes while it is being read, and write the batches in the
+        order they were taken.
+
+        Returns:
+            tuple: (batch number, rows to save, players to delete)
+        '''
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.batches += 1
+            number = self.batches
+            for player, game in pending.items():
+                self.writing[player] = (number, game)
+        now = time.time()
+        rows = []
+        deleted = []
+        for player, game in pending.items():
+            if game is None:
+                deleted.append((player,))
+                continue
+            puzzle = game.puzzle
+            position, snapshot = game.log.snapshot()
+            rows.append((player, puzzle.boxRows, puzzle.boxCols, game.difficulty, puzzle.difficulty,
+                         puzzle.seed, bytes(puzzle.cells), bytes(puzzle.solution), game.log.toBytes(),
+                         position, snapshot, now))
+        return number, rows, deleted
+
+    def write(self, batch):
+        '''
+        Writes what takePending() returned in one transaction. Games can be
+        saved and loaded while it runs. If the write fails, the batch's
+        changes go back to pending for the next flush and the error is
+        raised.
+        '''
+        number, rows, deleted = batch
+        written = False
+        try:
+            if rows or deleted:
+                with self.connectionLock, self.connection:
+                    self.connection.execute('BEGIN')
+                    self.connection.executemany('INSERT OR REPLACE INTO sessions VALUES '
+                                                '(?,?,?,?,?,?,?,?,?,?,?,?)', rows)
+                    self.connection.executemany('DELETE FROM sessions WHERE player = ?', deleted)
+            written = True
+        finally:
+            with self.lock:
+                for changes in (rows, deleted):
+                    for row in changes:
+                        player = row[0]
+                        # Unless a later batch has taken the player's game again
+                        taken = self.writing.get(player)
+                        if taken is None or taken[0] != number:
+                            continue
+                        del self.writing[player]
+                        # A save since the batch was taken is newer than it
+                        if not written and player not in self.pending:
+                            self.pending[player] = taken[1]
+
+    def flush(self):
+        'Writes every change noted since the last flush.'
+        self.write(self.takePending())
+
+    def close(self):
+        'Flushes and closes the database.'
+        self.flush()
+        with self.connectionLock:
+            self.connection.close()
@@ -0,0 +1,250 @@
+'''
+Board engine for Sudoku Adventure: Kids Edition.
+
+The board stores each cell as a small integer (0 for empty, 1 to N for a
+letter) and keeps one bitmask per row, column and box recording which
+values are already used there. The masks are updated every time a cell is
+set or cleared, so checking whether a value may go in a cell is a couple of
+bitwise operations instead of a scan over the grid.
+
+Each cell also keeps its candidates: a mask of the values that no other
+cell in its row, column or box holds. Placing a value only strikes it from
+the candidates of that cell's peers, and clearing one only gives it back to
+the peers that no longer see it, so hints and pencil marks are lookups.
+
+The board only holds game state. Which cells were given at the start, which
+the player filled in and which are highlighted are kept as bitsets over the
+cells (bit row * size + col), and BoardRenderer turns them into colours.
+
+Boards can be any size whose boxes tile the grid; the game offers 4x4, 9x9,
+16x16 and 25x25, played with the letters A, B, C, ... instead of numbers.
+'''
+
+import string
+
+from SudokuSolver import getPeers, solveCells
+
+# Box dimensions (rows, columns) for each supported board size
+BOX_SHAPES = {4: (2, 2), 6: (2, 3), 9: (3, 3), 16: (4, 4), 25: (5, 5)}
+
+def symbolsFor(size):
+    'Returns the letters used on a board of the given size (A, B, C, ...).'
+    return list(string.ascii_uppercase[:size])
+
+class SudokuBoard:
+    '''
+    A Sudoku board with incrementally maintained row, column and box masks.
+
+    Bit (value - 1) of a mask is set when that value is present in the unit.
+    '''
+
+    def __init__(self, boxRows=2, boxCols=2):
+        self.boxRows = boxRows
+        self.boxCols = boxCols
+        self.size = boxRows * boxCols
+        self.symbols = symbolsFor(self.size)
+        self.allValues = (1 << self.size) - 1
+        self.boxOf = [(row // boxRows) * boxRows + col // boxCols
+                      for row in range(self.size) for col in range(self.size)]
+        self.peers = getPeers(boxRows, boxCols)
+        self.reset()
+
+    def copy(self):
+        'Returns an independent copy of the board.'
+        other = SudokuBoard.__new__(SudokuBoard)
+        other.boxRows = self.boxRows
+        other.boxCols = self.boxCols
+        other.size = self.size
+        other.symbols = self.symbols
+        other.allValues = self.allValues
+        other.cells = self.cells[:]
+        other.rowMasks = self.rowMasks[:]
+        other.colMasks = self.colMasks[:]
+        other.boxMasks = self.boxMasks[:]
+        other.boxOf = self.boxOf
+        other.peers = self.peers
+        other.candidateMasks = self.candidateMasks[:]
+        other.emptyCount = self.emptyCount
+        other.valueCells = self.valueCells[:]
+        other.givenMask = self.givenMask
+        other.userMask = self.userMask
+        other.highlightValue = self.highlightValue
+        return other
+
+    def reset(self):
+        'Empties every cell on the board.'
+        self.cells = [0] * (self.size * self.size)
+        self.rowMasks = [0] * self.size
+        self.colMasks = [0] * self.size
+        self.boxMasks = [0] * self.size
+        self.candidateMasks = [self.allValues] * (self.size * self.size)
+        self.emptyCount = self.size * self.size
+        self.valueCells = [0] * (self.size + 1) # Cells holding each value
+        self.givenMask = 0                      # Cells given at the start
+        self.userMask = 0                       # Cells filled in by the player
+        self.highlightValue = 0                 # Value to highlight (0 for none)
+
+    def get(self, row, col):
+        'Returns the value in the cell (0 if it is empty).'
+        return self.cells[row * self.size + col]
+
+    def place(self, row, col, value, given=False):
+        '''
+        Puts a value in the cell, replacing whatever was there before. The
+        caller is expected to have checked the move with isLegal.
+
+        Parameters:
+            row (int): The row index.
+            col (int): The column index.
+            value (int): The value to place (1 to size).
+            given (bool): True for the starting letters of a puzzle, False
+                          for letters filled in by the player.
+        '''
+        index = row * self.size + col
+        if self.cells[index]:
+            self.clear(row, col)
+        bit = 1 << (value - 1)
+        self.cells[index] = value
+        self.rowMasks[row] |= bit
+        self.colMasks[col] |= bit
+        self.boxMasks[self.boxOf[index]] |= bit
+        candidateMasks = self.candidateMasks
+        keep = ~bit
+        for peer in self.peers[index]:
+            candidateMasks[peer] &= keep
+        self.emptyCount -= 1
+        self.valueCells[value] |= 1 << index
+        if given:
+            self.givenMask |= 1 << index
+        else:
+            self.userMask |= 1 << index
+
+    def clear(self, row, col):
+        'Empties the cell and releases its value in the row, column and box.'
+        index = row * self.size + col
+        value = self.cells[index]
+        if not value:
+            return
+        keep = ~(1 << (value - 1))
+        self.cells[index] = 0
+        self.rowMasks[row] &= keep
+        self.colMasks[col] &= keep
+        self.boxMasks[self.boxOf[index]] &= keep
+        # Peers get the value back unless another cell they see still holds it
+        bit = ~keep
+        size = self.size
+        for peer in self.peers[index]:
+            if not (self.rowMasks[peer // size] | self.colMasks[peer % size]
+                    | self.boxMasks[self.boxOf[peer]]) & bit:
+                self.candidateMasks[peer] |= bit
+        self.emptyCount += 1
+        cellBit = ~(1 << index)
+        self.valueCells[value] &= cellBit
+        self.givenMask &= cellBit
+        self.userMask &= cellBit
+
+    def isGiven(self, row, col):
+        'Returns True if the cell holds one of the starting letters of the puzzle.'
+        return bool(self.givenMask >> (row * self.size + col) & 1)
+
+    def setHighlight(self, value):
+        'Highlights every cell holding the value (0 turns highlighting off).'
+        self.highlightValue = value
+
+    @property
+    def highlightMask(self):
+        'Bitset of the highlighted cells.'
+        return self.valueCells[self.highlightValue] if self.highlightValue else 0
+
+    def ownBit(self, row, col):
+        'Returns the bit of the value currently in the cell (0 if empty).'
+        value = self.cells[row * self.size + col]
+        return 1 << (value - 1) if value else 0
+
+    def rowConflict(self, row, col, value):
+        'Returns True if the value is already used elsewhere in the row.'
+        return bool(self.rowMasks[row] & ~self.ownBit(row, col) & (1 << (value - 1)))
+
+    def colConflict(self, row, col, value):
+        'Returns True if the value is already used elsewhere in the column.'
+        return bool(self.colMasks[col] & ~self.ownBit(row, col) & (1 << (value - 1)))
+
+    def boxConflict(self, row, col, value):
+        'Returns True if the value is already used elsewhere in the box.'
+        box = self.boxOf[row * self.size + col]
+        return bool(self.boxMasks[box] & ~self.ownBit(row, col) & (1 << (value - 1)))
+
+    def candidates(self, row, col):
+        '''
+        Returns a mask of the values that could go in the cell without breaking
+        any rule. The value already in the cell does not count against it.
+        '''
+        return self.candidateMasks[row * self.size + col]
+
+    def pencilMarks(self):
+        '''
+        Returns the candidates of every empty cell.
+
+        Returns:
+            dict: Cell index -> mask of the values that fit there.
+        '''
+        candidateMasks = self.candidateMasks
+        return {index: candidateMasks[index] for index, value in enumerate(self.cells) if not value}
+
+    def singleCandidateCells(self):
+        'Returns the indexes of the empty cells where exactly one value fits.'
+        candidateMasks = self.candidateMasks
+        return [index for index, value in enumerate(self.cells)
+                if not value and candidateMasks[index] and not candidateMasks[index] & (candidateMasks[index] - 1)]
+
+    def isLegal(self, row, col, value):
+        'Returns True if the value can be placed in the cell without breaking a rule.'
+        return bool(self.candidates(row, col) & (1 << (value - 1)))
+
+    def isFull(self):
+        'Returns True if no cell is empty.'
+        return self.emptyCount == 0
+
+    def solve(self):
+        '''
+        Fills the board in place using the MRV solver in SudokuSolver.
+
+        Returns:
+            bool: True if a solution was found, False otherwise (the board is
+                  left unchanged in that case).
+        '''
+        solution = solveCells(self.cells, self.boxRows, self.boxCols)
+        if solution is None:
+            return False
+        for index, value in enumerate(solution):
+            if not self.cells[index]:
+                self.place(index // self.size, index % self.size, value)
+        return True
+
+    @classmethod
+    def ofSize(cls, size):
+        'Returns an empty board of the given size (4, 9, 16, ...).'
+        if size not in BOX_SHAPES:
+            raise ValueError('Unsupported board size: %s' % size)
+        return cls(*BOX_SHAPES[size])
+
+    @classmethod
+    def fromGrid(cls, grid, symbols=None):
+        '''
+        Builds a board from a 2D list of symbols, where anything that is not
+        one of the symbols counts as an empty cell.
+        '''
+        board = cls.ofSize(len(grid))
+        symbols = symbols or board.symbols
+        for row, line in enumerate(grid):
+            for col, symbol in enumerate(line):
+                if symbol in symbols:
+                    board.place(row, col, symbols.index(symbol) + 1)
+        return board
+
+    def toGrid(self, symbols=None, empty='0'):
+        'Returns the board as a 2D list of symbols.'
+        symbols = symbols or self.symbols
+        return [[symbols[value - 1] if value else empty
+                 for value in self.cells[row * self.size:(row + 1) * self.size]]
+                for row in range(self.size)]
@@ -0,0 +1,262 @@
+'''
+Headless game engine for Sudoku Adventure: Kids Edition.
+
+A Game holds everything about one puzzle being played: the board, the
+solution, the chosen difficulty and the moves made so far (a MoveLog, which
+gives undo and redo and lets a stored game be resumed). It does no input or
+output, so many games can run side by side in one process (for example
+behind a server), and GameManager is just one console front end for it.
+
+Rows, columns and values are plain integers: rows and columns count from 0
+and values from 1 (1 is A, 2 is B, ...). letterValue converts letters.
+'''
+
+import random
+
+from BoardRenderer import renderBoard
+from LogicSolver import LogicSolver, Step
+from MoveLog import MoveLog
+from PuzzleGenerator import generatePuzzle
+
+# The rules a move can break, in the order they are checked
+HORIZONTAL = 'horizontal'
+VERTICAL = 'vertical'
+SQUARE = 'square'
+
+class MoveError(ValueError):
+    'Raised for moves and requests the game does not allow.'
+
+class Game:
+    '''
+    One game of Sudoku.
+
+    In Easy mode the player may change letters, undo moves and ask for hints.
+    In Hard mode every letter is final and there are no hints.
+    '''
+
+    def __init__(self, puzzle, difficulty=None, log=None):
+        '''
+        Parameters:
+            puzzle (Puzzle): The puzzle to play (see PuzzleGenerator).
+            difficulty (str): 'Easy' or 'Hard'; defaults to the puzzle's grade.
+            log (MoveLog): The moves of a game of this puzzle to carry on
+                           from (default a new game).
+        '''
+        self.puzzle = puzzle
+        self.difficulty = difficulty or puzzle.difficulty
+        self.board = puzzle.board()
+        if log is None:
+            log = MoveLog(puzzle.cells)
+        else:
+            for index, value in enumerate(log.cells):
+                if value != puzzle.cells[index]:
+                    self._setCell(index, value)
+        self.log = log
+
+    @classmethod
+    def new(cls, size=4, difficulty='Easy', seed=None):
+        'Starts a game on a freshly generated puzzle.'
+        if seed is None:
+            seed = random.getrandbits(32)
+        return cls(generatePuzzle(seed, size, difficulty), difficulty)
+
+    @classmethod
+    def resume(cls, puzzle, difficulty, data, snapshot=None):
+        '''
+        Carries on a stored game.
+
+        Parameters:
+            puzzle (Puzzle): The puzzle of the game.
+            difficulty (str): 'Easy' or 'Hard'.
+            data (bytes): The moves, as returned by game.log.toBytes().
+            snapshot (tuple): game.log.snapshot() from when they were stored.
+        '''
+        return cls(puzzle, difficulty, MoveLog.fromBytes(puzzle.cells, data, snapshot))
+
+    @property
+    def size(self):
+        return self.board.size
+
+    @property
+    def symbols(self):
+        return self.board.symbols
+
+    @property
+    def hintsAllowed(self):
+        return self.difficulty == 'Easy'
+
+    def letterValue(self, letter):
+        'Returns the value of a letter on this board (A is 1).'
+        if letter not in self.board.symbols:
+            raise MoveError('Enter a valid letter (%s)!' % ','.join(self.board.symbols))
+        return self.board.symbols.index(letter) + 1
+
+    def _checkCell(self, row, col):
+        if not (0 <= row < self.size and 0 <= col < self.size):
+            raise MoveError('Enter a valid row and column (1-%d)!' % self.size)
+
+    def check(self, row, col, value):
+        '''
+        Checks a move without making it.
+
+        Returns:
+            str: The first rule the move would break (HORIZONTAL, VERTICAL or
+                 SQUARE), or None if it breaks none.
+        '''
+        self._checkCell(row, col)
+        if not 1 <= value <= self.size:
+            raise MoveError('Enter a valid letter (%s)!' % ','.join(self.board.symbols))
+        if self.board.rowConflict(row, col, value):
+            return HORIZONTAL
+        if self.board.colConflict(row, col, value):
+            return VERTICAL
+        if self.board.boxConflict(row, col, value):
+            return SQUARE
+        return None
+
+    def move(self, row, col, value):
+        '''
+        Puts a letter on the board if it breaks no rule.
+
+        Parameters:
+            row (int): The row index.
+            col (int): The column index.
+            value (int): The value to place (1 to size).
+
+        Returns:
+            str: The rule the move breaks (the board is left unchanged), or
+                 None if the letter was placed.
+
+        Raises:
+            MoveError: If the cell or letter is not valid, the cell holds a
+                       starting letter, or the move is not allowed in this mode.
+        '''
+        rule = self.check(row, col, value)
+        current = self.board.get(row, col)
+        if self.board.isGiven(row, col):
+            raise MoveError('That letter was there from the start, pick another cell!')
+        if current and self.difficulty == 'Hard':
+            raise MoveError('FULL: Pick a cell that is empty!')
+        if current == value:
+            raise MoveError('SAME LETTER: Pick a letter different from the one currently in the cell!')
+        if rule is None:
+            self.log.record(row * self.size + col, current, value)
+            self.board.place(row, col, value)
+        return rule
+
+    def _setCell(self, index, value):
+        row, col = divmod(index, self.size)
+        if value:
+            self.board.place(row, col, value)
+        else:
+            self.board.clear(row, col)
+
+    def undo(self):
+        '''
+        Takes back the last move (Easy mode only).
+
+        Returns:
+            bool: True if a move was taken back, False if there was none.
+        '''
+        if self.difficulty == 'Hard':
+            raise MoveError('Moves cannot be taken back in Hard mode!')
+        change = self.log.undo()
+        if change is None:
+            return False
+        self._setCell(*change)
+        return True
+
+    def redo(self):
+        '''
+        Makes the last move taken back by undo again (Easy mode only).
+
+        Returns:
+            bool: True if a move was made again, False if there was none.
+        '''
+        if self.difficulty == 'Hard':
+            raise MoveError('Moves cannot be taken back in Hard mode!')
+        change = self.log.redo()
+        if change is None:
+            return False
+        self._setCell(*change)
+        return True
+
+    def hint(self, row, col):
+        '''
+        Returns the values that could go in a cell without breaking a rule
+        (Easy mode only).
+        '''
+        if not self.hintsAllowed:
+            raise MoveError('Hints are NOT allowed in Hard mode!')
+        self._checkCell(row, col)
+        return self.maskValues(self.board.candidates(row, col))
+
+    def maskValues(self, mask):
+        'Returns the values whose bits are set in a candidate mask.'
+        return [value for value in range(1, self.size + 1) if mask >> (value - 1) & 1]
+
+    def pencilMarks(self):
+        '''
+        Returns the values that fit in every empty cell (Easy mode only).
+
+        Returns:
+            dict: (row, col) -> list of values.
+        '''
+        if not self.hintsAllowed:
+            raise MoveError('Hints are NOT allowed in Hard mode!')
+        return {divmod(index, self.size): self.maskValues(mask)
+                for index, mask in self.board.pencilMarks().items()}
+
+    def singles(self):
+        '''
+        Returns the empty cells where only one value fits (Easy mode only).
+
+        Returns:
+            list: (row, col) of each cell, row by row.
+        '''
+        if not self.hintsAllowed:
+            raise MoveError('Hints are NOT allowed in Hard mode!')
+        return [divmod(index, self.size) for index in self.board.singleCandidateCells()]
+
+    def tip(self):
+        '''
+        Explains how to find the next letter (Easy mode only). If a letter on
+        the board is wrong, the tip points that out instead.
+
+        Returns:
+            list: The Steps (see LogicSolver) that lead to the next letter,
+                  ending with the one that places it. Steps with no technique
+                  point out a mistake or, when the puzzle is beyond the
+                  solver's techniques, just give a letter away.
+        '''
+        if not self.hintsAllowed:
+            raise MoveError('Hints are NOT allowed in Hard mode!')
+        board = self.board
+        solution = self.puzzle.solution
+        mistakes = self.board.userMask
+        while mistakes:
+            index = (mistakes & -mistakes).bit_length() - 1
+            if board.cells[index] != solution[index]:
+                return [Step(None, index, 0, [], 'The letter in (%d,%d) is not right, try another one!'
+                             % (index // self.size + 1, index % self.size + 1))]
+            mistakes &= mistakes - 1
+        solver = LogicSolver.fromBoard(board)
+        steps = solver.nextPlacement()
+        if steps or solver.isSolved():
+            return steps
+        index = min((index for index, value in enumerate(board.cells) if not value),
+                    key=lambda index: bin(board.candidateMasks[index]).count('1'))
+        return [Step(None, index, solution[index], [], 'This one is tricky! %s goes in (%d,%d).'
+                     % (self.symbols[solution[index] - 1], index // self.size + 1, index % self.size + 1))]
+
+    def highlight(self, value):
+        'Highlights every cell holding the value when the board is drawn (0 for none).'
+        self.board.setHighlight(value)
+
+    def isSolved(self):
+        'Returns True once every cell is filled (moves never break a rule).'
+        return self.board.isFull()
+
+    def render(self, colours=True):
+        'Returns the board as text.'
+        return renderBoard(self.board, colours=colours)
@@ -0,0 +1,214 @@
+'''
+Fast solver for Sudoku boards of any size (4x4, 9x9, 16x16, 25x25...).
+
+The search always branches on the empty cell with the fewest remaining
+values (MRV) and, before every branch, propagates constraints: a cell with a
+single candidate is filled in (naked single), and a value that fits in only
+one cell of a row, column or box is placed there (hidden single). Candidate
+sets are bitmasks, so all of this is plain integer arithmetic. 4x4 boards
+are looked up in the table of all 288 complete boards (see FourByFour).
+'''
+
+import FourByFour
+from Metrics import metrics
+
+_geometries = {}
+_peers = {}
+
+def getGeometry(boxRows, boxCols):
+    '''
+    Returns the precomputed layout for a board shape: the row, column and box
+    of every cell, and the list of cells in every row, column and box.
+
+    Parameters:
+        boxRows (int): Number of rows in a box.
+        boxCols (int): Number of columns in a box.
+
+    Returns:
+        tuple: (rowOf, colOf, boxOf, units)
+    '''
+    key = (boxRows, boxCols)
+    if key not in _geometries:
+        size = boxRows * boxCols
+        rowOf = [index // size for index in range(size * size)]
+        colOf = [index % size for index in range(size * size)]
+        boxOf = [(rowOf[index] // boxRows) * boxRows + colOf[index] // boxCols
+                 for index in range(size * size)]
+        units = []
+        for unit in range(size):
+            units.append([unit * size + col for col in range(size)])
+            units.append([row * size + unit for row in range(size)])
+            units.append([index for index in range(size * size) if boxOf[index] == unit])
+        _geometries[key] = (rowOf, colOf, boxOf, units)
+    return _geometries[key]
+
+def getPeers(boxRows, boxCols):
+    '''
+    Returns, for every cell, the list of other cells that share its row,
+    column or box.
+    '''
+    key = (boxRows, boxCols)
+    if key not in _peers:
+        rowOf, colOf, boxOf, units = getGeometry(boxRows, boxCols)
+        peers = [set() for _ in rowOf]
+        for unit in units:
+            for index in unit:
+                peers[index].update(unit)
+        _peers[key] = [sorted(cells - {index}) for index, cells in enumerate(peers)]
+    return _peers[key]
+
+def solveCells(cells, boxRows, boxCols, rng=None):
+    '''
+    Solves a board given as a flat list of values (0 for empty, 1 to N).
+
+    Parameters:
+        cells (list): The cell values, row by row.
+        boxRows (int): Number of rows in a box.
+        boxCols (int): Number of columns in a box.
+        rng (random.Random): If given, the values of each guessed cell are
+                             tried in random order, so an empty board gives
+                             a random solution.
+
+    Returns:
+        list: The solved cell values, or None if the board has no solution.
+    '''
+    if (boxRows, boxCols) == (2, 2):
+        return FourByFour.solve(cells, rng) # Looked up, no search needed
+    size = boxRows * boxCols
+    allValues = (1 << size) - 1
+    rowOf, colOf, boxOf, units = getGeometry(boxRows, boxCols)
+    cells = list(cells)
+    rows = [0] * size
+    cols = [0] * size
+    boxes = [0] * size
+
+    for index, value in enumerate(cells):
+        if value:
+            bit = 1 << (value - 1)
+            if (rows[rowOf[index]] | cols[colOf[index]] | boxes[boxOf[index]]) & bit:
+                return None # The givens already break a rule
+            rows[rowOf[index]] |= bit
+            cols[colOf[index]] |= bit
+            boxes[boxOf[index]] |= bit
+
+    def assign(index, bit, trail):
+        cells[index] = bit.bit_length()
+        rows[rowOf[index]] |= bit
+        cols[colOf[index]] |= bit
+        boxes[boxOf[index]] |= bit
+        trail.append(index)
+
+    def undo(trail):
+        for index in trail:
+            keep = ~(1 << (cells[index] - 1))
+            cells[index] = 0
+            rows[rowOf[index]] &= keep
+            cols[colOf[index]] &= keep
+            boxes[boxOf[index]] &= keep
+
+    def propagate(trail):
+        # Returns the MRV cell and its candidates, (-1, 0) if the board is
+        # full, or None if a contradiction was found.
+        while True:
+            changed = False
+            best = -1
+            bestMask = 0
+            bestCount = size + 1
+            for index in range(size * size):
+                if cells[index]:
+                    continue
+                options = allValues & ~(rows[rowOf[index]] | cols[colOf[index]] | boxes[boxOf[index]])
+                if not options:
+                    return None
+                if not options & (options - 1):
+                    assign(index, options, trail)
+                    changed = True
+                    continue
+                count = options.bit_count()
+                if count < bestCount:
+                    best = index
+                    bestMask = options
+                    bestCount = count
+            if changed:
+                continue
+
+            for unit in units:
+                once = 0
+                twice = 0
+                placed = 0
+                for index in unit:
+                    if cells[index]:
+                        placed |= 1 << (cells[index] - 1)
+                        continue
+                    options = allValues & ~(rows[rowOf[index]] | cols[colOf[index]] | boxes[boxOf[index]])
+                    twice |= once & options
+                    once |= options
+                if (once | placed) != allValues:
+                    return None # Some value has nowhere to go in this unit
+                singles = once & ~twice
+                while singles:
+                    bit = singles & -singles
+                    singles ^= bit
+                    for index in unit:
+                        if not cells[index] and not (rows[rowOf[index]] | cols[colOf[index]] | boxes[boxOf[index]]) & bit:
+                            assign(index, bit, trail)
+                            changed = True
+                            break
+                    else:
+                        return None
+            if not changed:
+                return best, bestMask
+
+    def search():
+        # Depth-first search with an explicit stack instead of recursion, so
+        # the depth is not limited by Python's recursion limit. Every guessed
+        # cell has a frame (trail, index, values still to try): the trail
+        # lists the cells filled in at that level, the guess last. Returns
+        # (solved, nodes, backtracks, deepest level) for the metrics.
+        stack = []
+        trail = []
+        nodes = backtracks = maxDepth = 0
+        while True:
+            nodes += 1
+            if len(stack) >= maxDepth:
+                maxDepth = len(stack) + 1
+            result = propagate(trail)
+            if result is None:
+                undo(trail)
+                backtracks += 1
+                # Take back guesses until a frame has another value to try
+                while stack:
+                    frameTrail, index, bits = stack[-1]
+                    undo([frameTrail.pop()])
+                    if bits:
+                        break
+                    undo(frameTrail)
+                    stack.pop()
+                    backtracks += 1
+                else:
+                    return False, nodes, backtracks, maxDepth
+            elif result[0] < 0:
+                return True, nodes, backtracks, maxDepth
+            else:
+                index, options = result
+                bits = []
+                while options:
+                    bit = options & -options
+                    options ^= bit
+                    bits.append(bit)
+                if rng is not None:
+                    rng.shuffle(bits)
+                bits.reverse() # Tried from the end
+                stack.append((trail, index, bits))
+            frameTrail, index, bits = stack[-1]
+            assign(index, bits.pop(), frameTrail)
+            trail = []
+
+    found, nodes, backtracks, maxDepth = search()
+    if metrics.sink is not None:
+        labels = {'size': size}
+        metrics.observe('solver_nodes', nodes, labels)
+        metrics.observe('solver_backtracks', backtracks, labels)
+        metrics.observe('solver_max_depth', maxDepth, labels)
+    return cells if found else None
+